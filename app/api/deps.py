@@ -2,17 +2,15 @@ from typing import Annotated
 
 from fastapi.params import Depends, Header
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from starlette.websockets import WebSocket
 
 from app.configs.logging_settings import get_logger
-from app.crud.user import user_crud
-from app.db.postgres import session_maker
+from app.db.postgres import read_only_session_maker, session_maker
 from app.exceptions.unauthorized_401 import InvalidTokenException
 from app.exceptions.unprocessable_422 import UnprocessableException
 from app.schemas.jwt import TokenData
-from app.services import jwt_service
-from app.models.user import User as UserModel
+from app.services import auth_service
 
 logger = get_logger(__name__)
 
@@ -37,22 +35,23 @@ async def get_db_transaction() -> AsyncSession:
         await session.close()
 
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+async def get_db_read_only() -> AsyncSession:
+    # Nothing to commit, closing the session just hands the connection back to the pool
+    async with read_only_session_maker() as session:
+        yield session
 
 
-async def _verify_token(db: AsyncSession, token: str) -> TokenData:
-    token_data: TokenData = jwt_service.verify_token(token=token)
+def get_session_maker() -> async_sessionmaker:
+    return session_maker
 
-    user_db: UserModel | None = await user_crud.get_or_none(db=db, id=token_data.user_id)
-    if user_db is None:
-        raise InvalidTokenException(log_message=f'User with id `{token_data.user_id}` not found', logger=logger)
 
-    return token_data
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
-async def get_user_id(token: Annotated[str, Depends(oauth2_scheme)],
-                      db: AsyncSession = Depends(get_db)) -> int:
-    token_data: TokenData = await _verify_token(db=db, token=token)
+async def get_user_id(token: Annotated[str, Depends(oauth2_scheme)]) -> int:
+    # The connection goes back to the pool before the endpoint runs, so a request never holds both engines
+    async with read_only_session_maker() as db:
+        token_data: TokenData = await auth_service.authenticate(db=db, token=token)
     return token_data.user_id
 
 
@@ -60,8 +59,7 @@ def get_device_id(device_id: str = Header(...)) -> str:
     return device_id
 
 
-async def get_user_id_ws(websocket: WebSocket,
-                         db: AsyncSession = Depends(get_db)) -> int:
+async def get_user_id_ws(websocket: WebSocket) -> int:
     token: str | None = websocket.headers.get('Authorization')
     if token is None:
         raise InvalidTokenException(log_message='No token in header', logger=logger)
@@ -70,7 +68,9 @@ async def get_user_id_ws(websocket: WebSocket,
         raise InvalidTokenException('Not Bearer token', logger=logger)
     token: str = token.replace('Bearer ', '')
 
-    token_data: TokenData = await _verify_token(db=db, token=token)
+    # Dependencies live as long as the socket, so the session must not outlive the check
+    async with read_only_session_maker() as db:
+        token_data: TokenData = await auth_service.authenticate(db=db, token=token)
     return token_data.user_id
 
 
@@ -3,8 +3,9 @@ from typing import Annotated
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
 
-from app.api.deps import get_db
+from app.api.deps import get_db_read_only
 from app.schemas.jwt import Tokens
 from app.services import auth_service
 
@@ -13,13 +14,15 @@ router = APIRouter()
 
 @router.post('/token')
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                db: AsyncSession = Depends(get_db)) -> Tokens:
-    tokens: Tokens = await auth_service.login(db=db, form_data=form_data)
+                request: Request,
+                db: AsyncSession = Depends(get_db_read_only)) -> Tokens:
+    address: str | None = request.client.host if request.client is not None else None
+    tokens: Tokens = await auth_service.login(db=db, form_data=form_data, address=address)
     return tokens
 
 
 @router.post('/token/refresh')
 async def refresh_token(token: str,
-                        db: AsyncSession = Depends(get_db)) -> Tokens:
+                        db: AsyncSession = Depends(get_db_read_only)) -> Tokens:
     tokens: Tokens = await auth_service.refresh_token(db=db, token=token)
     return tokens
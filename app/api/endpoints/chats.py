@@ -1,24 +1,36 @@
 from fastapi import APIRouter
 from fastapi.params import Depends
 from fastapi_pagination import Page
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from starlette.websockets import WebSocket
 
-from app.api.deps import get_db, get_db_transaction, get_device_id_ws, get_user_id, get_user_id_ws
-from app.schemas.chat import Chat, ChatRequest
-from app.schemas.message import Message, MessageRequest
+from app.api.deps import (get_db_read_only, get_db_transaction, get_device_id_ws, get_session_maker, get_user_id,
+                          get_user_id_ws)
+from app.schemas.chat import Chat, ChatRequest, ChatUnread
+from app.schemas.message import HistoryMode, Message, MessageCursorPage, MessageRequest
 from app.services import chat_service, message_service
 
 router = APIRouter()
 
 
+@router.websocket('/ws')
+async def connect(websocket: WebSocket,
+                  current_user_id: int = Depends(get_user_id_ws),
+                  device_id: str = Depends(get_device_id_ws),
+                  session_maker: async_sessionmaker = Depends(get_session_maker)) -> None:
+    await chat_service.connect(session_maker=session_maker,
+                               websocket=websocket,
+                               current_user_id=current_user_id,
+                               device_id=device_id)
+
+
 @router.websocket('/ws/{chat_id}')
 async def connect_to_chat(chat_id: int,
                           websocket: WebSocket,
                           current_user_id: int = Depends(get_user_id_ws),
                           device_id: str = Depends(get_device_id_ws),
-                          db: AsyncSession = Depends(get_db)) -> None:
-    await chat_service.connect_to_chat(db=db,
+                          session_maker: async_sessionmaker = Depends(get_session_maker)) -> None:
+    await chat_service.connect_to_chat(session_maker=session_maker,
                                        websocket=websocket,
                                        chat_id=chat_id,
                                        current_user_id=current_user_id,
@@ -28,11 +40,18 @@ async def connect_to_chat(chat_id: int,
 @router.get('')
 async def get_chats(request: ChatRequest = Depends(),
                     current_user_id: int = Depends(get_user_id),
-                    db: AsyncSession = Depends(get_db)) -> Page[Chat]:
+                    db: AsyncSession = Depends(get_db_read_only)) -> Page[Chat]:
     chats: Page[Chat] = await chat_service.get_chats(db=db, request=request, current_user_id=current_user_id)
     return chats
 
 
+@router.get('/unread')
+async def get_unread_chats(current_user_id: int = Depends(get_user_id),
+                           db: AsyncSession = Depends(get_db_read_only)) -> list[ChatUnread]:
+    unread_chats: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=current_user_id)
+    return unread_chats
+
+
 @router.post('/private/{user_id}')
 async def create_private_chat(user_id: int,
                               current_user_id: int = Depends(get_user_id),
@@ -46,7 +65,7 @@ async def create_private_chat(user_id: int,
 @router.get('/{chat_id}')
 async def get_chat(chat_id: int,
                    current_user_id: int = Depends(get_user_id),
-                   db: AsyncSession = Depends(get_db)) -> Chat:
+                   db: AsyncSession = Depends(get_db_read_only)) -> Chat:
     chat: Chat = await chat_service.get_chat(db=db, chat_id=chat_id, current_user_id=current_user_id)
     return chat
 
@@ -55,7 +74,13 @@ async def get_chat(chat_id: int,
 async def get_messages(chat_id: int,
                        request: MessageRequest = Depends(),
                        _: int = Depends(get_user_id),
-                       db: AsyncSession = Depends(get_db)) -> Page[Message]:
+                       db: AsyncSession = Depends(get_db_read_only)) -> Page[Message] | MessageCursorPage:
+    if request.mode == HistoryMode.CURSOR:
+        page: MessageCursorPage = await message_service.get_messages_by_cursor(db=db,
+                                                                               chat_id=chat_id,
+                                                                               request=request)
+        return page
+
     messages: Page[Message] = await message_service.get_messages(db=db,
                                                                  chat_id=chat_id,
                                                                  request=request)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from fastapi_pagination import Page
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db_transaction, get_user_id
+from app.api.deps import get_db_read_only, get_db_transaction, get_user_id
 from app.schemas.group import Group, GroupCreateRequest, GroupMembersRequest, GroupRequest, GroupUsersCreateRequest
 from app.schemas.user import User
 from app.services import group_service
@@ -30,7 +30,7 @@ async def add_users_to_group(group_users_request: GroupUsersCreateRequest,
 @router.get('')
 async def get_groups(request: GroupRequest = Depends(),
                      _: int = Depends(get_user_id),
-                     db: AsyncSession = Depends(get_db_transaction)) -> Page[Group]:
+                     db: AsyncSession = Depends(get_db_read_only)) -> Page[Group]:
     groups: Page[Group] = await group_service.get_groups(db=db, request=request)
     return groups
 
@@ -38,7 +38,7 @@ async def get_groups(request: GroupRequest = Depends(),
 @router.get('/{group_id}')
 async def get_group(group_id: int,
                     _: int = Depends(get_user_id),
-                    db: AsyncSession = Depends(get_db_transaction)) -> Group:
+                    db: AsyncSession = Depends(get_db_read_only)) -> Group:
     group: Group = await group_service.get_group(db=db, group_id=group_id)
     return group
 
@@ -47,6 +47,6 @@ async def get_group(group_id: int,
 async def get_group_members(group_id: int,
                             request: GroupMembersRequest = Depends(),
                             _: int = Depends(get_user_id),
-                            db: AsyncSession = Depends(get_db_transaction)) -> Page[User]:
+                            db: AsyncSession = Depends(get_db_read_only)) -> Page[User]:
     users: Page[User] = await group_service.get_group_members(db=db, group_id=group_id, request=request)
     return users
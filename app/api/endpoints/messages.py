@@ -1,10 +1,12 @@
 from uuid import UUID
 
 from fastapi import APIRouter, Depends
+from fastapi_pagination import Page
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db, get_db_transaction, get_device_id, get_user_id
-from app.schemas.message import Message, MessageCreateRequest
+from app.api.deps import get_db_read_only, get_db_transaction, get_device_id, get_user_id
+from app.configs.settings import message_batch_settings
+from app.schemas.message import Message, MessageCreateRequest, MessageSearchRequest
 from app.services import message_service
 
 router = APIRouter()
@@ -15,6 +17,13 @@ async def send_message(create_data: MessageCreateRequest,
                        current_user_id: int = Depends(get_user_id),
                        device_id: str = Depends(get_device_id),
                        db: AsyncSession = Depends(get_db_transaction)) -> Message:
+    if message_batch_settings.enabled:
+        message: Message = await message_service.send_message_batched(db=db,
+                                                                      create_data=create_data,
+                                                                      current_user_id=current_user_id,
+                                                                      device_id=device_id)
+        return message
+
     message: Message = await message_service.send_message(db=db,
                                                           create_data=create_data,
                                                           current_user_id=current_user_id,
@@ -22,9 +31,19 @@ async def send_message(create_data: MessageCreateRequest,
     return message
 
 
+@router.get('/search')
+async def search_messages(request: MessageSearchRequest = Depends(),
+                          current_user_id: int = Depends(get_user_id),
+                          db: AsyncSession = Depends(get_db_read_only)) -> Page[Message]:
+    messages: Page[Message] = await message_service.search_messages(db=db,
+                                                                    request=request,
+                                                                    current_user_id=current_user_id)
+    return messages
+
+
 @router.get('/{message_id}')
 async def get_message(message_id: UUID,
                       _: int = Depends(get_user_id),
-                      db: AsyncSession = Depends(get_db)) -> Message:
+                      db: AsyncSession = Depends(get_db_read_only)) -> Message:
     message: Message = await message_service.get_message(db=db, message_id=message_id)
     return message
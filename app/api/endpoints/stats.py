@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_user_id
+from app.schemas.stats import Stats
+from app.services import stats_service
+
+router = APIRouter()
+
+
+@router.get('')
+async def get_stats(_: int = Depends(get_user_id)) -> Stats:
+    stats: Stats = stats_service.get_stats()
+    return stats
@@ -1,7 +1,7 @@
 from typing import Any, Generic, Type, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import select, Select, update, Update
+from sqlalchemy import insert, Insert, select, Select, update, Update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.base import Base
@@ -64,13 +64,13 @@ class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
         if isinstance(obj_in, BaseModel):
             obj_data = obj_in.model_dump(exclude_unset=True)
 
-        db_obj: Model = self.model(**obj_data)
-        db.add(db_obj)
         if flush:
             await db.flush()
+        # Server defaults come back with RETURNING, no refresh round trip
+        query: Insert = insert(self.model).values(obj_data).returning(self.model)
+        db_obj: Model = await db.scalar(query)
         if commit:
             await db.commit()
-        await db.refresh(db_obj)
         return db_obj
 
     async def create_batch(self,
@@ -85,14 +85,16 @@ class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
                 obj_data = obj_in.model_dump(exclude_unset=True)
             objs_data.append(obj_data)
 
-        db_objs: list[Model] = [self.model(**obj_data) for obj_data in objs_data]
-        db.add_all(db_objs)
+        if not objs_data:
+            return []
+
         if flush:
             await db.flush()
+        # Multi-row INSERT ... RETURNING, the models come back populated without a refresh per row
+        query: Insert = insert(self.model).returning(self.model, sort_by_parameter_order=True)
+        db_objs: list[Model] = (await db.scalars(query, objs_data)).all()
         if commit:
             await db.commit()
-        for db_obj in db_objs:
-            await db.refresh(db_obj)
 
         return db_objs
 
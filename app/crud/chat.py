@@ -1,10 +1,14 @@
+from datetime import datetime
+
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import and_, or_, Select, select
+from sqlalchemy import and_, func, or_, Row, Select, select, update, Update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from app.crud.base import CRUDBase
 from app.models.chat import Chat, ChatUser
+from app.models.message import Message
 from app.models.user import User
 from app.schemas.chat import ChatCreate, ChatRequest, ChatType, ChatUpdate, ChatUserCreate, ChatUserUpdate
 
@@ -26,6 +30,11 @@ class CRUDChat(CRUDBase[Chat, ChatCreate, ChatUpdate]):
         users: Page[Chat] = await paginate(db, query, request)
         return users
 
+    async def lock(self, db: AsyncSession, chat_id: int) -> None:
+        # FOR NO KEY UPDATE does not conflict with the key share lock taken by inserts of the chat messages
+        query: Select = select(self.model.id).where(self.model.id == chat_id).with_for_update(key_share=True)
+        await db.execute(query)
+
 
 chat_crud = CRUDChat(Chat)
 
@@ -36,5 +45,41 @@ class CRUDChatUser(CRUDBase[ChatUser, ChatUserCreate, ChatUserUpdate]):
         chat_user_ids: list[int] = (await db.scalars(query)).all()
         return chat_user_ids
 
+    async def get_user_chat_ids(self, db: AsyncSession, user_id: int, chat_ids: list[int]) -> list[int]:
+        query: Select = (select(self.model.chat_id)
+                         .where(self.model.user_id == user_id)
+                         .where(self.model.chat_id.in_(chat_ids)))
+        user_chat_ids: list[int] = (await db.scalars(query)).all()
+        return user_chat_ids
+
+    async def get_unread_chats(self, db: AsyncSession, user_id: int) -> list[ChatUser]:
+        query: Select = select(self.model).where(self.model.user_id == user_id).order_by(self.model.chat_id)
+        chat_users: list[ChatUser] = (await db.scalars(query)).all()
+        return chat_users
+
+    async def mark_read_up_to(self, db: AsyncSession, chat_id: int, user_id: int, read_up_to: datetime) -> Row | None:
+        """
+        Moves the user's read watermark forward and recounts the messages left unread after it.
+
+        Returns the row with the previous watermark of the user, None if the user is not a chat member.
+        """
+        previous: ChatUser = aliased(self.model)
+        new_read_up_to = func.greatest(self.model.read_up_to, read_up_to)
+        unread_count: Select = (select(func.count())
+                                .where(Message.chat_id == self.model.chat_id)
+                                .where(Message.sender_id != self.model.user_id)
+                                .where(Message.send_at > new_read_up_to)
+                                .scalar_subquery())
+        query: Update = (update(self.model)
+                         .where(self.model.chat_id == chat_id)
+                         .where(self.model.user_id == user_id)
+                         .where(previous.chat_id == self.model.chat_id)
+                         .where(previous.user_id == self.model.user_id)
+                         .values(read_up_to=new_read_up_to, unread_count=unread_count)
+                         .returning(previous.read_up_to.label('previous_read_up_to'))
+                         .execution_options(synchronize_session=False))
+        row: Row | None = (await db.execute(query)).one_or_none()
+        return row
+
 
 chat_user_crud = CRUDChatUser(ChatUser)
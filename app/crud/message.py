@@ -1,38 +1,216 @@
+from datetime import datetime
+from uuid import UUID
+
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import Select, select
+from sqlalchemy import (column, CTE, func, Integer, literal, literal_column, or_, Row, Select, select, String, tuple_, update,
+                        Update, values, Values)
+from sqlalchemy.dialects.postgresql import insert as pg_insert, UUID as DB_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud.base import CRUDBase
-from app.models import Message, MessageUserRead
-from app.schemas.message import (MessageCreate, MessageRequest, MessageUpdate, MessageUserReadCreate,
-                                 MessageUserReadUpdate)
+from app.models import Chat, ChatUser, Message
+from app.schemas.message import HistoryDirection, MessageCreate, MessageRequest, MessageSearchRequest, MessageUpdate
 
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
+    async def create_in_chat(self, db: AsyncSession, obj_in: MessageCreate) -> Row | None:
+        """
+        Inserts the message if the sender is a chat member and counts it as unread for the other members,
+        in a single statement.
+
+        Returns the message columns, its `Chat` and the `chat_user_ids` of the chat members,
+        or None if the chat does not exist, the sender is not its member or the message id already exists.
+        """
+        members: CTE = select(ChatUser.user_id).where(ChatUser.chat_id == obj_in.chat_id).cte('members')
+        sender_is_member = select(members.c.user_id).where(members.c.user_id == obj_in.sender_id).exists()
+        values: Select = (select(literal(obj_in.id, DB_UUID),
+                                 literal(obj_in.chat_id),
+                                 literal(obj_in.sender_id),
+                                 literal(obj_in.text, String))
+                          .where(sender_is_member))
+        inserted: CTE = (pg_insert(self.model)
+                         .from_select(['id', 'chat_id', 'sender_id', 'text'], values)
+                         .on_conflict_do_nothing(index_elements=['id'])
+                         .returning(self.model.id,
+                                    self.model.chat_id,
+                                    self.model.sender_id,
+                                    self.model.text,
+                                    self.model.send_at,
+                                    self.model.read_at)
+                         .cte('inserted'))
+        counted: CTE = (update(ChatUser)
+                        .where(ChatUser.chat_id == obj_in.chat_id)
+                        .where(ChatUser.user_id != obj_in.sender_id)
+                        .where(select(inserted.c.id).exists())
+                        .values(unread_count=ChatUser.unread_count + 1)
+                        .cte('counted'))
+        chat_user_ids = select(func.array_agg(members.c.user_id)).scalar_subquery()
+
+        query: Select = (select(inserted, Chat, chat_user_ids.label('chat_user_ids'))
+                         .join(Chat, Chat.id == inserted.c.chat_id)
+                         .add_cte(counted))
+        row: Row | None = (await db.execute(query)).one_or_none()
+        return row
+
+    async def create_batch_in_chats(self, db: AsyncSession, objs_in: list[MessageCreate]) -> list[Row]:
+        """
+        Batch version of `create_in_chat` for messages of any chats, in a single statement.
+
+        Messages whose sender is not a chat member or whose id already exists are skipped, the returned rows
+        cover the inserted messages only.
+        """
+        batch: Values = (values(column('id', DB_UUID),
+                                column('chat_id', Integer),
+                                column('sender_id', Integer),
+                                column('text', String),
+                                column('position', Integer),
+                                name='batch')
+                         .data([(obj_in.id, obj_in.chat_id, obj_in.sender_id, obj_in.text, position)
+                                for position, obj_in in enumerate(objs_in)]))
+        # History is ordered by (send_at, id), a microsecond apart per position keeps the batch in the sending order
+        send_at = func.now() + batch.c.position * literal_column("interval '1 microsecond'")
+        sender_is_member = (select(ChatUser.user_id)
+                            .where(ChatUser.chat_id == batch.c.chat_id)
+                            .where(ChatUser.user_id == batch.c.sender_id)
+                            .exists())
+        inserted: CTE = (pg_insert(self.model)
+                         .from_select(['id', 'chat_id', 'sender_id', 'text', 'send_at'],
+                                      select(batch.c.id, batch.c.chat_id, batch.c.sender_id, batch.c.text, send_at)
+                                      .where(sender_is_member))
+                         .on_conflict_do_nothing(index_elements=['id'])
+                         .returning(self.model.id,
+                                    self.model.chat_id,
+                                    self.model.sender_id,
+                                    self.model.text,
+                                    self.model.send_at,
+                                    self.model.read_at)
+                         .cte('inserted'))
+        unread = (select(ChatUser.chat_id, ChatUser.user_id, func.count().label('count'))
+                  .join(inserted, inserted.c.chat_id == ChatUser.chat_id)
+                  .where(ChatUser.user_id != inserted.c.sender_id)
+                  .group_by(ChatUser.chat_id, ChatUser.user_id)
+                  .subquery('unread'))
+        counted: CTE = (update(ChatUser)
+                        .where(ChatUser.chat_id == unread.c.chat_id)
+                        .where(ChatUser.user_id == unread.c.user_id)
+                        .values(unread_count=ChatUser.unread_count + unread.c.count)
+                        .cte('counted'))
+        chat_user_ids = (select(func.array_agg(ChatUser.user_id))
+                         .where(ChatUser.chat_id == inserted.c.chat_id)
+                         .scalar_subquery())
+
+        query: Select = (select(inserted, Chat, chat_user_ids.label('chat_user_ids'))
+                         .join(Chat, Chat.id == inserted.c.chat_id)
+                         .add_cte(counted))
+        rows: list[Row] = (await db.execute(query)).all()
+        return rows
+
     async def get_messages(self, db: AsyncSession, chat_id: int, request: MessageRequest) -> Page[Message]:
         query: Select = (select(self.model)
                          .where(self.model.chat_id == chat_id)
-                         .order_by(self.model.send_at))
+                         .order_by(self.model.send_at, self.model.id))
+        query: Select = self._filter_messages(query=query, request=request)
+
+        messages: Page[Message] = await paginate(db, query, request)
+        return messages
+
+    async def get_messages_by_cursor(self,
+                                     db: AsyncSession,
+                                     chat_id: int,
+                                     request: MessageRequest,
+                                     cursor: tuple[datetime, UUID] | None,
+                                     limit: int) -> list[Message]:
+        """Messages next to the cursor in the request direction, nearest first."""
+        query: Select = select(self.model).where(self.model.chat_id == chat_id)
+        query: Select = self._filter_messages(query=query, request=request)
+
+        position = tuple_(self.model.send_at, self.model.id)
+        match request.direction:
+            case HistoryDirection.BEFORE:
+                if cursor is not None:
+                    query = query.where(position < tuple_(*cursor))
+                query = query.order_by(self.model.send_at.desc(), self.model.id.desc())
+
+            case HistoryDirection.AFTER:
+                if cursor is not None:
+                    query = query.where(position > tuple_(*cursor))
+                query = query.order_by(self.model.send_at, self.model.id)
 
+        messages: list[Message] = (await db.scalars(query.limit(limit))).all()
+        return messages
+
+    def _filter_messages(self, query: Select, request: MessageRequest) -> Select:
         if request.sender_id is not None:
             query = query.where(self.model.sender_id == request.sender_id)
 
         if request.search_term is not None:
             query = query.where(self.model.text.ilike(f'%{request.search_term}%'))
 
+        return query
+
+    async def search_messages(self, db: AsyncSession, request: MessageSearchRequest, user_id: int) -> Page[Message]:
+        ts_query = self._ts_query(request.query)
+        user_chat_ids: Select = select(ChatUser.chat_id).where(ChatUser.user_id == user_id)
+        query: Select = (select(self.model)
+                         .where(self.model.chat_id.in_(user_chat_ids))
+                         .where(self.model.search_vector.bool_op('@@')(ts_query))
+                         .order_by(func.ts_rank(self.model.search_vector, ts_query).desc(),
+                                   self.model.send_at.desc()))
+
         messages: Page[Message] = await paginate(db, query, request)
         return messages
 
+    @staticmethod
+    def _ts_query(text: str):
+        return func.websearch_to_tsquery('simple', text)
 
-message_crud = CRUDMessage(Message)
+    async def get_messages_after(self, db: AsyncSession, chat_id: int, message_id: UUID, limit: int) -> list[Message]:
+        # Messages of one transaction share send_at, the id breaks the tie
+        last_seen_send_at: Select = select(self.model.send_at).where(self.model.id == message_id).scalar_subquery()
+        query: Select = (select(self.model)
+                         .where(self.model.chat_id == chat_id)
+                         .where(tuple_(self.model.send_at, self.model.id) > tuple_(last_seen_send_at, message_id))
+                         .order_by(self.model.send_at, self.model.id)
+                         .limit(limit))
+
+        messages: list[Message] = (await db.scalars(query)).all()
+        return messages
 
+    async def get_last_send_at(self, db: AsyncSession, chat_id: int) -> datetime | None:
+        query: Select = select(func.max(self.model.send_at)).where(self.model.chat_id == chat_id)
+        last_send_at: datetime | None = await db.scalar(query)
+        return last_send_at
 
-class CRUDMessageUserRead(CRUDBase[MessageUserRead, MessageUserReadCreate, MessageUserReadUpdate]):
-    async def get_user_ids_read_message(self, db: AsyncSession, message_id: int) -> list[int]:
-        query: Select = select(self.model.user_id).where(self.model.message_id == message_id).with_for_update()
-        user_ids_read_message: list[int] = (await db.scalars(query)).all()
-        return user_ids_read_message
+    async def get_last_send_at_by_chat(self, db: AsyncSession, message_ids: list[UUID]) -> dict[int, datetime]:
+        query: Select = (select(self.model.chat_id, func.max(self.model.send_at))
+                         .where(self.model.id.in_(message_ids))
+                         .group_by(self.model.chat_id))
+        last_send_at_by_chat: dict[int, datetime] = {chat_id: send_at for chat_id, send_at in await db.execute(query)}
+        return last_send_at_by_chat
+
+    async def mark_read_by_watermarks(self,
+                                      db: AsyncSession,
+                                      chat_id: int,
+                                      read_up_to: datetime,
+                                      read_after: datetime | None) -> None:
+        # A message is read once every member except its sender has read up to it. Only messages the reader has
+        # just passed, sent after `read_after` (the reader's previous watermark), can become read now
+        unread_by_member: Select = (select(ChatUser.user_id)
+                                    .where(ChatUser.chat_id == self.model.chat_id)
+                                    .where(ChatUser.user_id != self.model.sender_id)
+                                    .where(or_(ChatUser.read_up_to.is_(None),
+                                               ChatUser.read_up_to < self.model.send_at)))
+        query: Update = (update(self.model)
+                         .where(self.model.chat_id == chat_id)
+                         .where(self.model.read_at.is_(None))
+                         .where(self.model.send_at <= read_up_to)
+                         .where(~unread_by_member.exists())
+                         .values(read_at=func.now())
+                         .execution_options(synchronize_session=False))
+        if read_after is not None:
+            query = query.where(self.model.send_at > read_after)
+        await db.execute(query)
 
 
-message_user_read_crud = CRUDMessageUserRead(MessageUserRead)
+message_crud = CRUDMessage(Message)
@@ -0,0 +1,33 @@
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'post_commit_pending'
+
+
+class PostCommitHook:
+    """
+    Runs `callback` with the values added to a session once that session commits, rolled back values are dropped.
+
+    Values are kept in `session.info` per hook, so one pair of session listeners serves every hook.
+    """
+
+    def __init__(self, callback: Callable[[list], None]):
+        self.callback: Callable[[list], None] = callback
+
+    def add(self, db: AsyncSession, value) -> None:
+        db.info.setdefault(PENDING_KEY, {}).setdefault(self, []).append(value)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session: Session) -> None:
+    pending: dict[PostCommitHook, list] = session.info.pop(PENDING_KEY, {})
+    for hook, values in pending.items():
+        hook.callback(values)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
@@ -1,12 +1,50 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 
-from app.configs.settings import database_settings, EnvironmentType, settings
+from app.configs.settings import (database_settings, login_rate_limit_settings, message_bus_settings, MessageBusType,
+                                  RateLimiterBackendType)
+
+
+def get_max_overflows() -> tuple[int, int]:
+    """
+    Overflow of the read-write and of the read-only engine: what is left of `max_connections` after the base
+    pools of both engines and the asyncpg pools of the message bus and the rate limiter, split between the two.
+    """
+    other_connections: int = 0
+    if message_bus_settings.type == MessageBusType.POSTGRES:
+        other_connections += message_bus_settings.pool_size + 1
+    if login_rate_limit_settings.backend == RateLimiterBackendType.POSTGRES:
+        other_connections += login_rate_limit_settings.pool_size
+
+    base_connections: int = database_settings.pool_size + database_settings.read_only_pool_size + other_connections
+    overflow: int = max(database_settings.max_connections - base_connections, 0)
+    read_only_overflow: int = overflow // 2
+    return overflow - read_only_overflow, read_only_overflow
+
+
+max_overflow, read_only_max_overflow = get_max_overflows()
 
 engine = create_async_engine(database_settings.database_url,
                              pool_pre_ping=True,
-                             pool_size=2,
-                             max_overflow=30 if settings.environment == EnvironmentType.PROD else 10,
+                             pool_size=database_settings.pool_size,
+                             max_overflow=max_overflow,
                              # echo=True  # When True, enable log output for every query
                              )
 
 session_maker = async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+def create_read_only_engine(database_url: str) -> AsyncEngine:
+    # Reads run without BEGIN and COMMIT round trips, every statement is its own transaction which
+    # Postgres makes read only for the whole connection, set once when the connection is opened
+    return create_async_engine(database_url,
+                               pool_pre_ping=True,
+                               pool_size=database_settings.read_only_pool_size,
+                               max_overflow=read_only_max_overflow,
+                               isolation_level='AUTOCOMMIT',
+                               connect_args={'server_settings': {'default_transaction_read_only': 'on'}})
+
+
+read_only_engine = create_read_only_engine(database_url=database_settings.database_url)
+
+read_only_session_maker = async_sessionmaker(read_only_engine, autocommit=False, autoflush=False,
+                                             expire_on_commit=False)
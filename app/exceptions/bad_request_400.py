@@ -20,3 +20,12 @@ class BadRequestException(AppBaseException):
                          logger=logger,
                          log_level=log_level,
                          error_code=error_code)
+
+
+class InvalidCursorException(BadRequestException):
+    def __init__(self, cursor: str, logger: logging.Logger):
+        super().__init__(message='Invalid cursor',
+                         log_message=f'Invalid cursor `{cursor}`',
+                         logger=logger,
+                         log_level=LogLevelType.WARNING,
+                         error_code=ErrorCodeType.INVALID_CURSOR)
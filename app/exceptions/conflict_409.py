@@ -1,4 +1,5 @@
 import logging
+from uuid import UUID
 
 from sqlalchemy.exc import IntegrityError
 from starlette import status
@@ -32,3 +33,12 @@ class IntegrityException(ConflictException):
                          error_code=ErrorCodeType.INTEGRITY_ERROR,
                          logger=logger,
                          log_level=LogLevelType.WARNING)
+
+
+class MessageIdTakenException(ConflictException):
+    def __init__(self, message_id: UUID, logger: logging.Logger):
+        super().__init__(message='Entity integrity error',
+                         log_message=f'Message id `{message_id}` is already taken by another message',
+                         error_code=ErrorCodeType.INTEGRITY_ERROR,
+                         logger=logger,
+                         log_level=LogLevelType.WARNING)
@@ -0,0 +1,31 @@
+import logging
+
+from starlette import status
+
+from app.configs.logging_settings import LogLevelType
+from app.exceptions.base import AppBaseException
+from app.schemas.error_response import ErrorCodeType
+
+
+class TooManyRequestsException(AppBaseException):
+    def __init__(self,
+                 message: str,
+                 log_message: str,
+                 logger: logging.Logger,
+                 log_level: LogLevelType,
+                 error_code: ErrorCodeType | None = None):
+        super().__init__(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                         message=message,
+                         log_message=log_message,
+                         logger=logger,
+                         log_level=log_level,
+                         error_code=error_code)
+
+
+class TooManyLoginAttemptsException(TooManyRequestsException):
+    def __init__(self, key: str, logger: logging.Logger):
+        super().__init__(message='Too many login attempts',
+                         log_message=f'Login attempts limit reached for `{key}`',
+                         logger=logger,
+                         log_level=LogLevelType.WARNING,
+                         error_code=ErrorCodeType.TOO_MANY_LOGIN_ATTEMPTS)
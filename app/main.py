@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from starlette.requests import Request
@@ -6,12 +7,36 @@ from starlette.responses import JSONResponse
 
 from app.api.api import api_router
 from app.configs.logging_settings import get_logger
-from app.configs.settings import EnvironmentType, settings
+from app.configs.settings import EnvironmentType, message_batch_settings, settings
+from app.db.postgres import session_maker
 from app.exceptions.base import AppBaseException
 from app.schemas.error_response import ErrorResponse
+from app.services.message_batcher import message_batcher
+from app.services.message_bus import message_bus
+from app.services.message_dispatcher import message_dispatcher
+from app.services.rate_limiter import login_rate_limiter
+from app.services.websocket_manager import websocket_manager
 
 logger = get_logger(__name__)
-app = FastAPI(title=settings.app_title)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await message_bus.start()
+    await websocket_manager.start()
+    await message_dispatcher.start()
+    await login_rate_limiter.start()
+    if message_batch_settings.enabled:
+        await message_batcher.start(session_maker=session_maker)
+    yield
+    await message_batcher.stop()
+    await login_rate_limiter.stop()
+    await message_dispatcher.stop()
+    await websocket_manager.stop()
+    await message_bus.stop()
+
+
+app = FastAPI(title=settings.app_title, lifespan=lifespan)
 
 log_level = logging.INFO if settings.environment == EnvironmentType.PROD else logging.DEBUG
 logging.getLogger('uvicorn.access').setLevel(log_level)
@@ -1,5 +1,6 @@
 from app.models.base import Base
 from app.models.chat import Chat, ChatUser
 from app.models.group import Group
-from app.models.message import Message, MessageUserRead
+from app.models.message import Message
+from app.models.rate_limit import RateLimitBucket
 from app.models.user import User
@@ -29,6 +29,10 @@ class ChatUser(Base):
     __table_args__ = (UniqueConstraint('chat_id', 'user_id', name='chat_user_unique'),)
 
     chat_id: Mapped[int] = mapped_column(Integer, ForeignKey(Chat.id), primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.id), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.id), primary_key=True, index=True)
+    # send_at of the newest message the user has read, everything sent up to it is read by the user
+    read_up_to: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # Messages of other members sent after read_up_to, kept up to date on send and read
+    unread_count: Mapped[int] = mapped_column(Integer, server_default='0', nullable=False)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
@@ -1,9 +1,9 @@
 from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import DateTime, ForeignKey, func, Integer, String, UniqueConstraint
+from sqlalchemy import Computed, DateTime, DDL, event, ForeignKey, func, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID as DB_UUID
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID as DB_UUID
 
 from app.models.base import Base
 from app.models.chat import Chat
@@ -12,10 +12,14 @@ from app.models.user import User
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (Index('ix_messages_chat_id_send_at', 'chat_id', 'send_at', 'id'),
+                      Index('ix_messages_search_vector', 'search_vector', postgresql_using='gin'),
+                      Index('ix_messages_text_trgm', 'text', postgresql_using='gin',
+                            postgresql_ops={'text': 'gin_trgm_ops'}))
 
     id: Mapped[UUID] = mapped_column(DB_UUID, primary_key=True)  # noqa: A003
     chat_id: Mapped[int] = mapped_column(Integer, ForeignKey(Chat.id), nullable=False)
-    sender_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.id), nullable=False)
+    sender_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.id), nullable=False, index=True)
     text: Mapped[str] = mapped_column(String(4096), nullable=False)
 
     chat: Mapped[Chat] = relationship(Chat, foreign_keys=[chat_id], lazy='selectin')
@@ -25,10 +29,11 @@ class Message(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now(),
                                                  nullable=False)
 
+    # 'simple' configuration: no stemming or stop words, chats are multilingual
+    search_vector: Mapped[str] = mapped_column(TSVECTOR,
+                                               Computed("to_tsvector('simple', text)", persisted=True),
+                                               deferred=True)
 
-class MessageUserRead(Base):
-    __tablename__ = 'message_users_read'
-    __table_args__ = (UniqueConstraint('message_id', 'user_id', name='message_user_read_unique'),)
 
-    message_id: Mapped[UUID] = mapped_column(DB_UUID, ForeignKey(Message.id), primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.id), primary_key=True)
+# The trigram index of the history `search_term` filter needs pg_trgm
+event.listen(Message.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
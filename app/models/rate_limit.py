@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Double, func, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class RateLimitBucket(Base):
+    __tablename__ = 'rate_limit_buckets'
+    # Losing the buckets on a crash only resets the limits, so the table skips the WAL
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+
+    key: Mapped[str] = mapped_column(String(320), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Double, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
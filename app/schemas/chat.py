@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 
 from fastapi import Query
@@ -29,6 +30,13 @@ class Chat(ChatBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ChatUnread(BaseModel):
+    chat_id: int
+    unread_count: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class ChatRequest(Params):
     page: int = Query(1, ge=1, description='Page number')
     size: int = Query(10, ge=1, le=20, description='Page size')
@@ -42,7 +50,7 @@ class ChatUserBase(BaseModel):
 
 
 class ChatUserCreate(ChatUserBase):
-    pass
+    read_up_to: datetime | None = None
 
 
 class ChatUserUpdate(BaseModel):
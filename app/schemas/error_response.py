@@ -10,6 +10,8 @@ class ErrorCodeType(str, Enum):
 
     NOT_IMPLEMENTED = 'NOT_IMPLEMENTED'
 
+    INVALID_CURSOR = 'INVALID_CURSOR'
+
     USER_NOT_CHAT_MEMBER = 'USER_NOT_CHAT_MEMBER'
     USER_IS_NOT_GROUP_OWNER = 'USER_IS_NOT_GROUP_OWNER'
 
@@ -17,6 +19,8 @@ class ErrorCodeType(str, Enum):
     INVALID_TOKEN = 'INVALID_TOKEN'
     TOKEN_EXPIRED = 'TOKEN_EXPIRED'
 
+    TOO_MANY_LOGIN_ATTEMPTS = 'TOO_MANY_LOGIN_ATTEMPTS'
+
 
 class ErrorResponse(BaseModel):
     message: str
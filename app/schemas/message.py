@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from uuid import UUID
 
 from fastapi import Query
@@ -38,6 +39,16 @@ class Message(MessageCreate):
     model_config = ConfigDict(from_attributes=True)
 
 
+class HistoryMode(str, Enum):
+    PAGE = 'page'
+    CURSOR = 'cursor'
+
+
+class HistoryDirection(str, Enum):
+    BEFORE = 'before'
+    AFTER = 'after'
+
+
 class MessageRequest(Params):
     page: int = Query(1, ge=1, description='Page number')
     size: int = Query(10, ge=1, le=20, description='Page size')
@@ -45,15 +56,25 @@ class MessageRequest(Params):
     sender_id: int | None = None
     search_term: constr(min_length=3) | None = None
 
+    mode: HistoryMode = Query(HistoryMode.PAGE, description='`cursor` pages by cursor and skips the total count')
+    cursor: str | None = Query(None, description='Cursor mode: `before` or `after` cursor of a previous page')
+    direction: HistoryDirection = Query(HistoryDirection.BEFORE, description='Cursor mode: older or newer messages')
 
-class MessageRead(BaseModel):
-    message_id: UUID
 
+class MessageSearchRequest(Params):
+    page: int = Query(1, ge=1, description='Page number')
+    size: int = Query(10, ge=1, le=20, description='Page size')
+
+    query: constr(min_length=1, max_length=256) = Query(..., description='Words to search, web search syntax')
 
-class MessageUserReadCreate(BaseModel):
-    message_id: UUID
-    user_id: int
 
+class MessageCursorPage(BaseModel):
+    items: list[Message]
+    # Cursors of the first and the last item. `before` is None once the oldest message is reached,
+    # `after` is always given as new messages can arrive at any time
+    before: str | None = None
+    after: str | None = None
 
-class MessageUserReadUpdate(BaseModel):
-    pass
+
+class MessageRead(BaseModel):
+    message_id: UUID
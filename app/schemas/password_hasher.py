@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class PasswordHasherStats(BaseModel):
+    max_workers: int
+    queued: int
+    running: int
+    completed: int
+    total_wait_seconds: float
+    max_wait_seconds: float
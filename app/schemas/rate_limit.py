@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class LoginRateLimiterStats(BaseModel):
+    allowed: int
+    rejected_by_address: int
+    rejected_by_username: int
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+from app.schemas.password_hasher import PasswordHasherStats
+from app.schemas.rate_limit import LoginRateLimiterStats
+from app.schemas.websocket import WebsocketStats
+
+
+class Stats(BaseModel):
+    websocket: WebsocketStats
+    password_hasher: PasswordHasherStats
+    login_rate_limiter: LoginRateLimiterStats
@@ -0,0 +1,44 @@
+from enum import Enum
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class MessageEvent(BaseModel):
+    message_id: UUID
+    chat_id: int
+    chat_user_ids: set[int]
+    device_id: str
+
+
+class WebsocketStats(BaseModel):
+    connections: int
+    queued_messages: int
+    max_queue_depth: int
+    dropped_messages: int
+    evicted_connections: int
+    rejected_connections: int
+    reaped_connections: int
+    replay_hits: int
+    replay_misses: int
+
+
+class WebsocketFrameType(str, Enum):
+    SUBSCRIBE = 'subscribe'
+    UNSUBSCRIBE = 'unsubscribe'
+    READ = 'read'
+    PONG = 'pong'
+    REPLAY = 'replay'
+
+    SUBSCRIBED = 'subscribed'
+    UNSUBSCRIBED = 'unsubscribed'
+    PING = 'ping'
+    REPLAYED = 'replayed'
+
+
+class WebsocketFrame(BaseModel):
+    type: WebsocketFrameType  # noqa: A003
+    chat_id: int | None = None
+    chat_ids: list[int] = []
+    message_id: UUID | None = None
+    has_more: bool | None = None
@@ -0,0 +1,61 @@
+import time
+
+from cachetools import TLRUCache, TTLCache
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import auth_cache_settings
+from app.schemas.jwt import TokenData
+from app.services.message_bus import BaseMessageBus, message_bus
+
+logger = get_logger(__name__)
+
+USERS_CHANNEL = 'users'
+
+
+class AuthCache:
+    """
+    Decoded tokens and ids of existing users, so authenticating a request needs neither a JWT decode nor a query.
+
+    A token is kept until it expires. A user is trusted to exist for `user_ttl` seconds, deleting a user
+    must call `invalidate_user`, which forgets the user in every worker through the message bus.
+    """
+
+    def __init__(self, message_bus: BaseMessageBus, max_tokens: int, max_users: int, user_ttl: float):
+        self.tokens: TLRUCache = TLRUCache(maxsize=max_tokens,
+                                           ttu=lambda _, token_data, __: token_data.expired_at.timestamp(),
+                                           timer=time.time)
+        self.users: TTLCache = TTLCache(maxsize=max_users, ttl=user_ttl)
+
+        self.message_bus: BaseMessageBus = message_bus
+        self.message_bus.subscribe(channel=USERS_CHANNEL, handler=self._on_invalidation_event)
+
+    def get_token(self, token: str) -> TokenData | None:
+        token_data: TokenData | None = self.tokens.get(token)
+        return token_data
+
+    def add_token(self, token: str, token_data: TokenData) -> None:
+        self.tokens[token] = token_data
+
+    def user_exists(self, user_id: int) -> bool:
+        return user_id in self.users
+
+    def add_user(self, user_id: int) -> None:
+        self.users[user_id] = True
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """To be called once a user deletion is committed."""
+        self.users.pop(user_id, None)
+        await self.message_bus.publish(channel=USERS_CHANNEL, payload=str(user_id))
+
+    async def _on_invalidation_event(self, payload: str) -> None:
+        self.users.pop(int(payload), None)
+
+    def clear(self) -> None:
+        self.tokens.clear()
+        self.users.clear()
+
+
+auth_cache = AuthCache(message_bus=message_bus,
+                       max_tokens=auth_cache_settings.max_tokens,
+                       max_users=auth_cache_settings.max_users,
+                       user_ttl=auth_cache_settings.user_ttl)
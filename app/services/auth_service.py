@@ -1,4 +1,3 @@
-import bcrypt
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,16 +7,27 @@ from app.exceptions.unauthorized_401 import InvalidLoginDataException, InvalidTo
 from app.models.user import User as UserModel
 from app.schemas.jwt import TokenData, TokenDataCreate, Tokens, TokenType
 from app.services import jwt_service
+from app.services.auth_cache import auth_cache
+from app.services.password_hasher import password_hasher
+from app.services.rate_limiter import login_rate_limiter
 
 logger = get_logger(__name__)
 
+# Same as UserCreateRequest.username, longer usernames can not exist and must not reach the rate limiter keys
+USERNAME_MAX_LENGTH: int = 256
+
+
+async def login(db: AsyncSession, form_data: OAuth2PasswordRequestForm, address: str | None = None) -> Tokens:
+    if len(form_data.username) > USERNAME_MAX_LENGTH:
+        raise InvalidLoginDataException(username=f'{form_data.username[:USERNAME_MAX_LENGTH]}...', logger=logger)
+
+    await login_rate_limiter.check(username=form_data.username, address=address)
 
-async def login(db: AsyncSession, form_data: OAuth2PasswordRequestForm) -> Tokens:
     user_db: UserModel | None = await user_crud.get_or_none(db=db, username=form_data.username)
     if user_db is None:
         raise InvalidLoginDataException(username=form_data.username, logger=logger)
 
-    if not bcrypt.checkpw(form_data.password.encode(), user_db.password.encode()):
+    if not await password_hasher.check(password=form_data.password, hashed_password=user_db.password):
         raise InvalidLoginDataException(username=form_data.username, user_id=user_db.id, logger=logger)
 
     tokens: Tokens = jwt_service.generate_auth_tokens(token_data=TokenDataCreate(sub=str(user_db.id)))
@@ -35,3 +45,20 @@ async def refresh_token(db: AsyncSession, token: str) -> Tokens:
 
     tokens: Tokens = jwt_service.generate_auth_tokens(token_data=TokenDataCreate(sub=str(user_db.id)))
     return tokens
+
+
+async def authenticate(db: AsyncSession, token: str) -> TokenData:
+    """Verifies the token of a request, repeated tokens of existing users are answered from the cache."""
+    token_data: TokenData | None = auth_cache.get_token(token=token)
+    if token_data is None:
+        token_data = jwt_service.verify_token(token=token)
+        auth_cache.add_token(token=token, token_data=token_data)
+
+    if not auth_cache.user_exists(user_id=token_data.user_id):
+        user_db: UserModel | None = await user_crud.get_or_none(db=db, id=token_data.user_id)
+        if user_db is None:
+            raise InvalidTokenException(log_message=f'User with id `{token_data.user_id}` not found', logger=logger)
+
+        auth_cache.add_user(user_id=token_data.user_id)
+
+    return token_data
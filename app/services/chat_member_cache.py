@@ -0,0 +1,82 @@
+import asyncio
+from uuid import uuid4
+
+from cachetools import TTLCache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import chat_member_cache_settings
+from app.db.post_commit import PostCommitHook
+from app.schemas.chat import Chat
+from app.services.message_bus import BaseMessageBus, message_bus
+
+logger = get_logger(__name__)
+
+CHAT_MEMBERS_CHANNEL = 'chat_members'
+
+
+class ChatMemberCache:
+    """
+    Chats with their member ids by chat id, so membership checks of hot chats need no query.
+
+    A session changing the members of a chat calls `invalidate_after_commit`; once it commits the chat is dropped
+    here and, through the message bus, in every other worker. Entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, message_bus: BaseMessageBus, max_size: int, ttl: float):
+        self.chats: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        # Bumped on every invalidation, a lookup that raced with one is not cached
+        self.version: int = 0
+        self.background_tasks: set[asyncio.Task] = set()
+        # The bus delivers invalidations to the publishing worker too, it has already applied them
+        self.worker_id: str = uuid4().hex
+
+        self.message_bus: BaseMessageBus = message_bus
+        self.message_bus.subscribe(channel=CHAT_MEMBERS_CHANNEL, handler=self._on_invalidation_event)
+
+        self.post_commit: PostCommitHook = PostCommitHook(callback=self._after_commit)
+
+    def get(self, chat_id: int) -> tuple[Chat, frozenset[int]] | None:
+        cached: tuple[Chat, frozenset[int]] | None = self.chats.get(chat_id)
+        return cached
+
+    def add(self, chat: Chat, chat_user_ids: list[int], version: int) -> None:
+        """Caches the chat loaded after `version` was read, unless a chat was invalidated meanwhile."""
+        if version == self.version:
+            self.chats[chat.id] = (chat, frozenset(chat_user_ids))
+
+    def invalidate_after_commit(self, db: AsyncSession, chat_id: int) -> None:
+        self.post_commit.add(db=db, value=chat_id)
+
+    def _after_commit(self, chat_ids: list[int]) -> None:
+        self._invalidate(chat_ids=set(chat_ids))
+        payload: str = f'{self.worker_id}:{",".join(str(chat_id) for chat_id in sorted(set(chat_ids)))}'
+        task: asyncio.Task = asyncio.create_task(self._publish(payload=payload))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _publish(self, payload: str) -> None:
+        try:
+            await self.message_bus.publish(channel=CHAT_MEMBERS_CHANNEL, payload=payload)
+
+        except Exception as exc:
+            logger.error(f'Error while publishing chat members invalidation `{payload}`: {exc}')
+
+    async def _on_invalidation_event(self, payload: str) -> None:
+        worker_id, chat_ids = payload.split(':', 1)
+        if worker_id != self.worker_id:
+            self._invalidate(chat_ids={int(chat_id) for chat_id in chat_ids.split(',')})
+
+    def _invalidate(self, chat_ids: set[int]) -> None:
+        self.version += 1
+        for chat_id in chat_ids:
+            self.chats.pop(chat_id, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self.chats.clear()
+
+
+chat_member_cache = ChatMemberCache(message_bus=message_bus,
+                                    max_size=chat_member_cache_settings.max_size,
+                                    ttl=chat_member_cache_settings.ttl)
@@ -1,48 +1,195 @@
 import asyncio
+from datetime import datetime
+from json import JSONDecodeError
+from typing import Callable
+from uuid import UUID
 
 from fastapi_pagination import Page
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from starlette.websockets import WebSocket, WebSocketDisconnect
 from websockets import ConnectionClosedError, ConnectionClosedOK
 
 from app.configs.logging_settings import get_logger
+from app.configs.settings import websocket_settings
 from app.crud.chat import chat_crud, chat_user_crud
+from app.crud.message import message_crud
 from app.exceptions.conflict_409 import IntegrityException
 from app.exceptions.forbidden_403 import UserNotChatMemberException
 from app.exceptions.not_fount_404 import EntityNotFound
+from app.exceptions.not_implemented_501 import NotImplementedException
 from app.models.chat import Chat as ChatModel, ChatUser as ChatUserModel
-from app.schemas.chat import Chat, ChatCreate, ChatRequest, ChatType, ChatUserCreate
-from app.schemas.message import MessageRead
+from app.schemas.chat import Chat, ChatCreate, ChatRequest, ChatType, ChatUnread, ChatUserCreate
+from app.schemas.message import Message, MessageRead
+from app.schemas.websocket import WebsocketFrame, WebsocketFrameType
 from app.services import message_service
+from app.services.chat_member_cache import chat_member_cache
+from app.services.connection_registry import Connection
 from app.services.websocket_manager import websocket_manager
 
 logger = get_logger(__name__)
 
 
-async def connect_to_chat(db: AsyncSession,
+async def connect_to_chat(session_maker: async_sessionmaker,
                           websocket: WebSocket,
                           chat_id: int,
                           current_user_id: int,
                           device_id: str):
-    await get_chat(db=db, chat_id=chat_id, current_user_id=current_user_id)
-    await websocket_manager.connect(websocket=websocket, chat_id=chat_id, user_id=current_user_id, device_id=device_id)
+    async with session_maker() as db:
+        await get_chat(db=db, chat_id=chat_id, current_user_id=current_user_id)
+
+    connection: Connection | None = await websocket_manager.connect(websocket=websocket,
+                                                                    user_id=current_user_id,
+                                                                    device_id=device_id,
+                                                                    chat_id=chat_id)
+    if connection is None:
+        return
+
+    await _serve(session_maker=session_maker, websocket=websocket, connection=connection,
+                 parse_frame=_parse_chat_frame)
+
+
+async def connect(session_maker: async_sessionmaker, websocket: WebSocket, current_user_id: int, device_id: str):
+    connection: Connection | None = await websocket_manager.connect(websocket=websocket,
+                                                                    user_id=current_user_id,
+                                                                    device_id=device_id)
+    if connection is None:
+        return
+
+    await _serve(session_maker=session_maker, websocket=websocket, connection=connection,
+                 parse_frame=WebsocketFrame.model_validate)
+
+
+def _parse_chat_frame(frame_dict: dict) -> WebsocketFrame:
+    # Untyped frames are read receipts, the only frame this socket had before typed frames
+    if 'type' in frame_dict:
+        return WebsocketFrame.model_validate(frame_dict)
+
+    message_read: MessageRead = MessageRead(**frame_dict)
+    frame: WebsocketFrame = WebsocketFrame(type=WebsocketFrameType.READ, message_id=message_read.message_id)
+    return frame
+
+
+async def _serve(session_maker: async_sessionmaker,
+                 websocket: WebSocket,
+                 connection: Connection,
+                 parse_frame: Callable[[dict], WebsocketFrame]) -> None:
+    frames: asyncio.Queue[WebsocketFrame] = asyncio.Queue(maxsize=websocket_settings.inbound_queue_size)
+    processor: asyncio.Task = asyncio.create_task(_process_frames(session_maker=session_maker,
+                                                                  connection=connection,
+                                                                  frames=frames))
 
     try:
         while True:
-            await asyncio.sleep(1)
-            message_read_dict: dict = await websocket.receive_json()
             try:
-                message_read: MessageRead = MessageRead(**message_read_dict)
-                await message_service.read_message(db=db,
-                                                   message_id=message_read.message_id,
-                                                   current_user_id=current_user_id)
+                frame_dict: dict = await websocket.receive_json()
+            except JSONDecodeError as exc:
+                logger.error(f'Error while parsing websocket frame: {exc}')
+                continue
+
+            websocket_manager.touch(connection=connection)
+            if not isinstance(frame_dict, dict):
+                logger.error(f'Error while parsing websocket frame: `{frame_dict}` is not an object')
+                continue
+
+            if frame_dict.get('type') == WebsocketFrameType.PONG:
+                continue
+
+            try:
+                frame: WebsocketFrame = parse_frame(frame_dict)
             except Exception as exc:
-                logger.error(f'Error while read message: {exc}')
+                logger.error(f'Error while parsing websocket frame: {exc}')
                 continue
 
+            await frames.put(frame)
+
     except (ConnectionClosedOK, RuntimeError, WebSocketDisconnect, ConnectionClosedError):
-        websocket_manager.disconnect(chat_id=chat_id, user_id=current_user_id, device_id=device_id)
+        pass
+
+    finally:
+        # Whatever ended the loop, the socket must leave the registry and stop counting against the limit
+        websocket_manager.disconnect(connection=connection)
+        processor.cancel()
+
+
+async def _process_frames(session_maker: async_sessionmaker,
+                          connection: Connection,
+                          frames: asyncio.Queue[WebsocketFrame]) -> None:
+    while True:
+        # Frames which arrived while the previous batch was processed are handled together
+        batch: list[WebsocketFrame] = [await frames.get()]
+        while len(batch) < websocket_settings.read_batch_size and not frames.empty():
+            batch.append(frames.get_nowait())
+
+        # A session is taken per batch, an idle socket holds no pooled connection
+        try:
+            async with session_maker.begin() as db:
+                await _handle_frames(db=db, connection=connection, frames=batch)
+        except Exception as exc:
+            logger.error(f'Error while handling websocket frames: {exc}')
+
+
+async def _handle_frames(db: AsyncSession, connection: Connection, frames: list[WebsocketFrame]) -> None:
+    read_message_ids: list[UUID] = [frame.message_id for frame in frames
+                                    if frame.type == WebsocketFrameType.READ and frame.message_id is not None]
+    if len(read_message_ids) > 0:
+        await message_service.read_messages(db=db, message_ids=read_message_ids, current_user_id=connection.user_id)
+
+    for frame in frames:
+        if frame.type != WebsocketFrameType.READ:
+            await _handle_frame(db=db, connection=connection, frame=frame)
+
+
+async def _handle_frame(db: AsyncSession, connection: Connection, frame: WebsocketFrame) -> None:
+    match frame.type:
+        case WebsocketFrameType.SUBSCRIBE:
+            chat_ids: list[int] = await get_user_chat_ids(db=db, user_id=connection.user_id, chat_ids=frame.chat_ids)
+            websocket_manager.subscribe(connection=connection, chat_ids=set(chat_ids))
+            reply: WebsocketFrame = WebsocketFrame(type=WebsocketFrameType.SUBSCRIBED, chat_ids=sorted(chat_ids))
+
+        case WebsocketFrameType.UNSUBSCRIBE:
+            websocket_manager.unsubscribe(connection=connection, chat_ids=set(frame.chat_ids))
+            reply: WebsocketFrame = WebsocketFrame(type=WebsocketFrameType.UNSUBSCRIBED, chat_ids=frame.chat_ids)
+
+        case WebsocketFrameType.REPLAY:
+            # A chat socket replays its own chat unless told otherwise
+            chat_id: int | None = frame.chat_id if frame.chat_id is not None else connection.key[2]
+            if chat_id not in connection.chat_ids or frame.message_id is None:
+                logger.warning(f'Replay of chat `{chat_id}` ignored for connection `{connection.key}`')
+                return
+
+            has_more: bool = await _replay(db=db, connection=connection, chat_id=chat_id, message_id=frame.message_id)
+            reply: WebsocketFrame = WebsocketFrame(type=WebsocketFrameType.REPLAYED, chat_id=chat_id, has_more=has_more)
+
+        case _:
+            raise NotImplementedException(log_message=f'Websocket frame {frame.type} not implemented', logger=logger)
+
+    websocket_manager.send_frame(connection=connection, payload=reply.model_dump_json(exclude_unset=True))
+
+
+async def _replay(db: AsyncSession, connection: Connection, chat_id: int, message_id: UUID) -> bool:
+    """Returns True when more messages were missed than replayed, the client then falls back to the history."""
+    has_more: bool = False
+    payloads: list[str] | None = websocket_manager.get_missed_messages(chat_id=chat_id, message_id=message_id)
+    if payloads is None:
+        # One message over the limit tells whether the history goes on
+        messages: list[Message] = await message_service.get_messages_after(
+            db=db, chat_id=chat_id, message_id=message_id, limit=websocket_settings.replay_buffer_size + 1
+        )
+        has_more: bool = len(messages) > websocket_settings.replay_buffer_size
+        payloads: list[str] = [message.model_dump_json()
+                               for message in messages[:websocket_settings.replay_buffer_size]]
+
+    for payload in payloads:
+        websocket_manager.send_frame(connection=connection, payload=payload)
+
+    return has_more
+
+
+async def get_unread_chats(db: AsyncSession, current_user_id: int) -> list[ChatUnread]:
+    chat_users_db: list[ChatUserModel] = await chat_user_crud.get_unread_chats(db=db, user_id=current_user_id)
+    unread_chats: list[ChatUnread] = [ChatUnread.model_validate(chat_user_db) for chat_user_db in chat_users_db]
+    return unread_chats
 
 
 async def get_chats(db: AsyncSession, request: ChatRequest, current_user_id: int) -> Page[Chat]:
@@ -62,14 +209,27 @@ async def create_chat(db: AsyncSession, create_data: ChatCreate) -> Chat:
     return chat
 
 
-async def create_chat_users(db: AsyncSession, chat_id: int, user_ids: list[int]) -> None:
-    chat_users_create: list[ChatUserCreate] = [ChatUserCreate(chat_id=chat_id, user_id=user_id) for user_id in user_ids]
+async def create_chat_users(db: AsyncSession,
+                            chat_id: int,
+                            user_ids: list[int],
+                            read_up_to: datetime | None = None) -> None:
+    chat_users_create: list[ChatUserCreate] = [ChatUserCreate(chat_id=chat_id, user_id=user_id, read_up_to=read_up_to)
+                                               for user_id in user_ids]
     try:
         await chat_user_crud.create_batch(db=db, objs_in=chat_users_create)
 
     except IntegrityError as exc:
         raise IntegrityException(entity=ChatUserModel, exception=exc, logger=logger)
 
+    chat_member_cache.invalidate_after_commit(db=db, chat_id=chat_id)
+
+
+async def add_chat_users(db: AsyncSession, chat_id: int, user_ids: list[int]) -> None:
+    # Members joining a chat with history have read everything sent before they joined, which is what their
+    # unread count of 0 says. Without a watermark a member has read nothing, the unread count is then every message
+    read_up_to: datetime | None = await message_crud.get_last_send_at(db=db, chat_id=chat_id)
+    await create_chat_users(db=db, chat_id=chat_id, user_ids=user_ids, read_up_to=read_up_to)
+
 
 async def create_private_chat(db: AsyncSession, user_id: int, current_user_id: int) -> Chat:
     users_ids: list[int] = [user_id, current_user_id]
@@ -84,13 +244,38 @@ async def create_private_chat(db: AsyncSession, user_id: int, current_user_id: i
 
 
 async def get_chat(db: AsyncSession, chat_id: int, current_user_id: int) -> Chat:
-    chat_db: ChatModel | None = await chat_crud.get_or_none(db=db, id=chat_id)
-    if chat_db is None:
-        raise EntityNotFound(entity=ChatModel, search_params={'id': chat_id}, logger=logger)
+    cached: tuple[Chat, frozenset[int]] | None = chat_member_cache.get(chat_id=chat_id)
+    if cached is None:
+        version: int = chat_member_cache.version
+        chat_db: ChatModel | None = await chat_crud.get_or_none(db=db, id=chat_id)
+        if chat_db is None:
+            raise EntityNotFound(entity=ChatModel, search_params={'id': chat_id}, logger=logger)
+
+        chat: Chat = Chat.model_validate(chat_db)
+        chat_user_ids: list[int] = await chat_user_crud.get_chat_user_ids(db=db, chat_id=chat_db.id)
+        chat_member_cache.add(chat=chat, chat_user_ids=chat_user_ids, version=version)
+
+    else:
+        chat, chat_user_ids = cached
 
-    chat_user_ids: list[int] = await chat_user_crud.get_chat_user_ids(db=db, chat_id=chat_db.id)
     if current_user_id not in chat_user_ids:
-        raise UserNotChatMemberException(user_id=current_user_id, chat_id=chat_db.id, logger=logger)
+        raise UserNotChatMemberException(user_id=current_user_id, chat_id=chat.id, logger=logger)
 
-    chat: Chat = Chat.model_validate(chat_db)
     return chat
+
+
+async def get_user_chat_ids(db: AsyncSession, user_id: int, chat_ids: list[int]) -> list[int]:
+    """Chats out of `chat_ids` the user is a member of, only chats missing in the cache are queried."""
+    user_chat_ids: list[int] = []
+    uncached_chat_ids: list[int] = []
+    for chat_id in chat_ids:
+        cached: tuple[Chat, frozenset[int]] | None = chat_member_cache.get(chat_id=chat_id)
+        if cached is None:
+            uncached_chat_ids.append(chat_id)
+        elif user_id in cached[1]:
+            user_chat_ids.append(chat_id)
+
+    if len(uncached_chat_ids) > 0:
+        user_chat_ids += await chat_user_crud.get_user_chat_ids(db=db, user_id=user_id, chat_ids=uncached_chat_ids)
+
+    return user_chat_ids
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from starlette.websockets import WebSocket
+
+ConnectionKey = tuple[int, str, int | None]
+
+
+class Connection:
+    __slots__ = ('key', 'websocket', 'user_id', 'device_id', 'chat_ids', 'queue', 'writer_task', 'last_seen_at')
+
+    def __init__(self, websocket: WebSocket, user_id: int, device_id: str, chat_id: int | None, queue_size: int):
+        # Sockets opened for one chat are keyed by that chat, device-level sockets have chat_id None
+        self.key: ConnectionKey = (user_id, device_id, chat_id)
+        self.websocket: WebSocket = websocket
+        self.user_id: int = user_id
+        self.device_id: str = device_id
+        self.chat_ids: set[int] = set() if chat_id is None else {chat_id}
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: asyncio.Task | None = None
+        # Monotonic time of the last frame received from the client
+        self.last_seen_at: float = time.monotonic()
+
+
+class ConnectionRegistry:
+    """
+    Live websocket connections of one worker, indexed by chat, user and device.
+
+    The registry is bounded but never evicts: once it is full, `add` refuses new keys and the caller
+    is expected to reject the socket. Every index holds keys only and is cleaned up together with the connection.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections: int = max_connections
+        self.connections: dict[ConnectionKey, Connection] = {}
+        self.chat_index: dict[int, set[ConnectionKey]] = {}
+        self.user_index: dict[int, set[ConnectionKey]] = {}
+        self.device_index: dict[tuple[int, str], set[ConnectionKey]] = {}
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def get(self, key: ConnectionKey) -> Connection | None:
+        return self.connections.get(key, None)
+
+    def is_registered(self, connection: Connection) -> bool:
+        # The key may already belong to a newer connection of the same device
+        return self.connections.get(connection.key, None) is connection
+
+    def values(self) -> list[Connection]:
+        return list(self.connections.values())
+
+    def add(self, connection: Connection) -> bool:
+        if connection.key not in self.connections and len(self.connections) >= self.max_connections:
+            return False
+
+        self.connections[connection.key] = connection
+        self._index(index=self.user_index, value=connection.user_id, key=connection.key)
+        self._index(index=self.device_index, value=(connection.user_id, connection.device_id), key=connection.key)
+        for chat_id in connection.chat_ids:
+            self._index(index=self.chat_index, value=chat_id, key=connection.key)
+        return True
+
+    def remove(self, connection: Connection) -> bool:
+        if not self.is_registered(connection):
+            return False
+
+        self.connections.pop(connection.key)
+        self._unindex(index=self.user_index, value=connection.user_id, key=connection.key)
+        self._unindex(index=self.device_index, value=(connection.user_id, connection.device_id), key=connection.key)
+        for chat_id in connection.chat_ids:
+            self._unindex(index=self.chat_index, value=chat_id, key=connection.key)
+        return True
+
+    def subscribe(self, connection: Connection, chat_ids: set[int]) -> None:
+        if not self.is_registered(connection):
+            return
+
+        connection.chat_ids.update(chat_ids)
+        for chat_id in chat_ids:
+            self._index(index=self.chat_index, value=chat_id, key=connection.key)
+
+    def unsubscribe(self, connection: Connection, chat_ids: set[int]) -> None:
+        connection.chat_ids.difference_update(chat_ids)
+        if not self.is_registered(connection):
+            return
+
+        for chat_id in chat_ids:
+            self._unindex(index=self.chat_index, value=chat_id, key=connection.key)
+
+    def get_chat_connections(self, chat_id: int) -> list[Connection]:
+        return self._lookup(keys=self.chat_index.get(chat_id, set()))
+
+    def get_user_connections(self, user_id: int) -> list[Connection]:
+        return self._lookup(keys=self.user_index.get(user_id, set()))
+
+    def get_device_connections(self, user_id: int, device_id: str) -> list[Connection]:
+        return self._lookup(keys=self.device_index.get((user_id, device_id), set()))
+
+    def _lookup(self, keys: set[ConnectionKey]) -> list[Connection]:
+        return [self.connections[key] for key in keys]
+
+    @staticmethod
+    def _index(index: dict, value: int | tuple, key: ConnectionKey) -> None:
+        if value not in index:
+            index[value] = set()
+        index[value].add(key)
+
+    @staticmethod
+    def _unindex(index: dict, value: int | tuple, key: ConnectionKey) -> None:
+        if value in index:
+            index[value].discard(key)
+            if len(index[value]) == 0:
+                index.pop(value)
@@ -3,14 +3,12 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.configs.logging_settings import get_logger
-from app.crud.chat import chat_user_crud
 from app.crud.group import group_crud
 from app.exceptions.conflict_409 import IntegrityException
 from app.exceptions.forbidden_403 import UserNotGroupOwner
 from app.exceptions.not_fount_404 import EntityNotFound
-from app.models.chat import ChatUser as ChatUserModel
 from app.models.group import Group as GroupModel
-from app.schemas.chat import Chat, ChatCreate, ChatType, ChatUserCreate
+from app.schemas.chat import Chat, ChatCreate, ChatType
 from app.schemas.group import (Group, GroupCreate, GroupCreateRequest, GroupMembersRequest, GroupRequest,
                                GroupUsersCreateRequest)
 from app.schemas.user import User, UserRequest
@@ -32,12 +30,7 @@ async def create_group(db: AsyncSession, create_data: GroupCreateRequest, curren
     except IntegrityError as exc:
         raise IntegrityException(entity=GroupModel, exception=exc, logger=logger)
 
-    chat_user_create: ChatUserCreate = ChatUserCreate(chat_id=chat.id, user_id=current_user_id)
-    try:
-        await chat_user_crud.create(db=db, obj_in=chat_user_create)
-
-    except IntegrityError as exc:
-        raise IntegrityException(entity=ChatUserModel, exception=exc, logger=logger)
+    await chat_service.create_chat_users(db=db, chat_id=chat.id, user_ids=[current_user_id])
 
     group: Group = Group.model_validate(group_db)
     return group
@@ -53,7 +46,7 @@ async def add_users_to_group(db: AsyncSession,
     if current_user_id != group_db.creator_id:
         raise UserNotGroupOwner(user_id=current_user_id, group_id=group_db.id, logger=logger)
 
-    await chat_service.create_chat_users(db=db, chat_id=group_db.chat_id, user_ids=group_users_request.user_ids)
+    await chat_service.add_chat_users(db=db, chat_id=group_db.chat_id, user_ids=group_users_request.user_ids)
 
 
 async def get_groups(db: AsyncSession, request: GroupRequest) -> Page[Group]:
@@ -0,0 +1,109 @@
+import asyncio
+from uuid import UUID
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import message_batch_settings
+from app.crud.message import message_crud
+from app.schemas.chat import Chat
+from app.schemas.message import Message, MessageCreate
+from app.services.message_dispatcher import message_dispatcher
+from app.services.sent_message_cache import sent_message_cache
+
+logger = get_logger(__name__)
+
+
+class MessageBatcher:
+    """
+    Group commit for new messages.
+
+    Messages sent concurrently are collected for up to `window` seconds after the first one and written with one
+    INSERT and one COMMIT, each sender gets its own message back. A message the batch could not insert
+    (the sender is not a chat member or the id exists) resolves to None, so the caller can fall back to the single
+    message path which tells a retry from a rejected message. So does every message of a batch which failed.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window: float = window
+        self.max_size: int = max_size
+        self.session_maker: async_sessionmaker | None = None
+        self.queue: asyncio.Queue[tuple[MessageCreate, str, asyncio.Future]] | None = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self, session_maker: async_sessionmaker) -> None:
+        self.session_maker = session_maker
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(queue=self.queue))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        while self.queue is not None and not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            future.cancel()
+        self.queue = None
+
+    async def send(self, message_create: MessageCreate, device_id: str) -> Message | None:
+        if self.queue is None:
+            raise RuntimeError('Message batcher is not started')
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((message_create, device_id, future))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue[tuple[MessageCreate, str, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: list[tuple[MessageCreate, str, asyncio.Future]] = [await queue.get()]
+            deadline: float = loop.time() + self.window
+            while len(batch) < self.max_size:
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=deadline - loop.time()))
+                except TimeoutError:
+                    break
+
+            await self._write(batch=batch)
+
+    async def _write(self, batch: list[tuple[MessageCreate, str, asyncio.Future]]) -> None:
+        try:
+            async with self.session_maker.begin() as db:
+                rows: list[Row] = await message_crud.create_batch_in_chats(
+                    db=db, objs_in=[message_create for message_create, _, _ in batch]
+                )
+
+                rows_by_id: dict[UUID, Row] = {row.id: row for row in rows}
+                messages: list[Message | None] = []
+                for message_create, device_id, _ in batch:
+                    row: Row | None = rows_by_id.pop(message_create.id, None)
+                    if row is None:
+                        messages.append(None)
+                        continue
+
+                    message: Message = Message(**row._mapping, chat=Chat.model_validate(row.Chat))
+                    sent_message_cache.add_after_commit(db=db, message=message)
+                    message_dispatcher.dispatch_after_commit(db=db,
+                                                             message=message,
+                                                             chat_id=message.chat_id,
+                                                             chat_user_ids=set(row.chat_user_ids),
+                                                             device_id=device_id)
+                    messages.append(message)
+
+        except Exception as exc:
+            # One bad message must not fail the whole batch, every message is retried on the single message path
+            logger.error(f'Error while writing a batch of {len(batch)} messages, sending them one by one: {exc}')
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            return
+
+        logger.debug(f'Wrote a batch of {len(batch)} messages')
+        for (_, _, future), message in zip(batch, messages):
+            if not future.done():
+                future.set_result(message)
+
+
+message_batcher = MessageBatcher(window=message_batch_settings.window, max_size=message_batch_settings.max_size)
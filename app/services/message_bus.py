@@ -0,0 +1,190 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+import asyncpg
+from cachetools import LRUCache
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import database_settings, message_bus_settings, MessageBusType
+
+logger = get_logger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+
+
+class BaseMessageBus(ABC):
+    """
+    Publish/subscribe bus used to fan out events to every worker process.
+
+    Each worker subscribes its handlers once at startup, and every payload published on a channel
+    is delivered to the handlers of that channel in all workers, including the publishing one.
+    """
+
+    def __init__(self, channel_prefix: str = ''):
+        self.channel_prefix: str = channel_prefix
+        self.handlers: dict[str, list[Handler]] = {}
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        if channel not in self.handlers:
+            self.handlers[channel] = []
+        self.handlers[channel].append(handler)
+
+    async def _dispatch(self, channel: str, payload: str) -> None:
+        for handler in self.handlers.get(channel, []):
+            try:
+                await handler(payload)
+
+            except Exception as exc:
+                logger.error(f'Error while handling `{channel}` event: {exc}')
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: str) -> None:
+        pass
+
+
+class InMemoryMessageBus(BaseMessageBus):
+    """Single process bus, handlers are called right away. Suitable for tests and one worker deployments."""
+
+    async def publish(self, channel: str, payload: str) -> None:
+        await self._dispatch(channel=channel, payload=payload)
+
+
+class PostgresMessageBus(BaseMessageBus):
+    """
+    Bus on top of Postgres LISTEN/NOTIFY.
+
+    NOTIFY payload must be shorter than 8000 bytes, so bigger payloads are split into chunks which are sent
+    in one statement (and so one transaction) and glued back together on the listening side.
+    A lost LISTEN connection (a Postgres restart or failover) is reopened with a backoff.
+    """
+
+    max_payload_size: int = 7900
+    max_pending_events: int = 1024
+    min_reconnect_delay: float = 0.5
+    max_reconnect_delay: float = 30
+
+    def __init__(self, dsn: str, channel_prefix: str = '', pool_size: int = 4):
+        super().__init__(channel_prefix=channel_prefix)
+        self.dsn: str = dsn
+        self.pool_size: int = pool_size
+        self.listen_connection: asyncpg.Connection | None = None
+        self.publish_pool: asyncpg.Pool | None = None
+        self.pending_events: LRUCache = LRUCache(maxsize=self.max_pending_events)
+        self.tasks: set[asyncio.Task] = set()
+
+    def _channel_name(self, channel: str) -> str:
+        return f'{self.channel_prefix}_{channel}' if self.channel_prefix else channel
+
+    async def start(self) -> None:
+        self.publish_pool = await asyncpg.create_pool(dsn=self.dsn, min_size=1, max_size=self.pool_size)
+        await self._listen()
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+        if self.listen_connection is not None:
+            # Unset first, so closing it is not taken for a lost connection
+            listen_connection: asyncpg.Connection = self.listen_connection
+            self.listen_connection = None
+            await listen_connection.close()
+
+        if self.publish_pool is not None:
+            await self.publish_pool.close()
+            self.publish_pool = None
+
+    async def _listen(self) -> None:
+        listen_connection: asyncpg.Connection = await asyncpg.connect(dsn=self.dsn)
+        try:
+            for channel in self.handlers:
+                await listen_connection.add_listener(self._channel_name(channel), self._on_notification)
+
+        except Exception:
+            await listen_connection.close()
+            raise
+
+        listen_connection.add_termination_listener(self._on_listen_connection_lost)
+        self.listen_connection = listen_connection
+
+        logger.debug(f'Postgres message bus is listening to channels: {list(self.handlers)}')
+
+    def _on_listen_connection_lost(self, connection: asyncpg.Connection) -> None:
+        if connection is not self.listen_connection:
+            return
+
+        # Events published until the reconnect are lost, caches invalidated by them stay stale up to their ttl
+        logger.error('Postgres message bus lost its LISTEN connection, reconnecting')
+        self.listen_connection = None
+        task: asyncio.Task = asyncio.create_task(self._reconnect())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _reconnect(self) -> None:
+        delay: float = self.min_reconnect_delay
+        while True:
+            try:
+                await self._listen()
+
+            except Exception as exc:
+                logger.error(f'Postgres message bus failed to reconnect: {exc}, retrying in {delay} s')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            logger.info('Postgres message bus reconnected')
+            return
+
+    def _split(self, payload: str) -> list[str]:
+        event_id: str = uuid4().hex
+        if len(payload.encode()) <= self.max_payload_size:
+            parts: list[str] = [payload]
+        else:
+            # 4 bytes is the longest utf-8 character, so every part fits the limit regardless of the text
+            part_size: int = self.max_payload_size // 4
+            parts: list[str] = [payload[i:i + part_size] for i in range(0, len(payload), part_size)]
+
+        return [f'{event_id}:{index}:{len(parts)}:{part}' for index, part in enumerate(parts)]
+
+    async def publish(self, channel: str, payload: str) -> None:
+        async with self.publish_pool.acquire() as connection:
+            await connection.execute('SELECT pg_notify($1, part) FROM unnest($2::text[]) AS part',
+                                     self._channel_name(channel), self._split(payload))
+
+    def _on_notification(self, _: asyncpg.Connection, __: int, channel_name: str, notification: str) -> None:
+        event_id, index, count, part = notification.split(':', 3)
+        if count == '1':
+            payload: str = part
+        else:
+            parts: dict[int, str] = self.pending_events.setdefault(event_id, {})
+            parts[int(index)] = part
+            if len(parts) < int(count):
+                return
+
+            self.pending_events.pop(event_id)
+            payload: str = ''.join(parts[i] for i in range(len(parts)))
+
+        channel: str = channel_name.removeprefix(f'{self.channel_prefix}_') if self.channel_prefix else channel_name
+        task: asyncio.Task = asyncio.create_task(self._dispatch(channel=channel, payload=payload))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+def get_message_bus() -> BaseMessageBus:
+    match message_bus_settings.type:
+        case MessageBusType.POSTGRES:
+            return PostgresMessageBus(dsn=database_settings.db_asyncpg_url(),
+                                      channel_prefix=message_bus_settings.channel_prefix,
+                                      pool_size=message_bus_settings.pool_size)
+        case _:
+            return InMemoryMessageBus(channel_prefix=message_bus_settings.channel_prefix)
+
+
+message_bus: BaseMessageBus = get_message_bus()
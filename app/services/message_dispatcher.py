@@ -0,0 +1,74 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.configs.logging_settings import get_logger
+from app.db.post_commit import PostCommitHook
+from app.schemas.message import Message
+from app.services.websocket_manager import websocket_manager, WebsocketManager
+
+logger = get_logger(__name__)
+
+
+class MessageDispatcher:
+    """
+    Post-commit outbox for new messages.
+
+    Messages registered on a session with `dispatch_after_commit` get into the outbox only once that session
+    commits and are forgotten on rollback. A background task drains the outbox into the websocket manager,
+    so the fan-out runs off the request path and in commit order.
+    """
+
+    def __init__(self, websocket_manager: WebsocketManager):
+        self.websocket_manager: WebsocketManager = websocket_manager
+        self.outbox: asyncio.Queue[dict] | None = None
+        self.task: asyncio.Task | None = None
+        self.post_commit: PostCommitHook = PostCommitHook(callback=self._after_commit)
+
+    def dispatch_after_commit(self,
+                              db: AsyncSession,
+                              message: Message,
+                              chat_id: int,
+                              chat_user_ids: set[int],
+                              device_id: str) -> None:
+        self.post_commit.add(db=db, value={'message': message,
+                                           'chat_id': chat_id,
+                                           'chat_user_ids': chat_user_ids,
+                                           'device_id': device_id})
+
+    def _after_commit(self, dispatches: list[dict]) -> None:
+        for dispatch in dispatches:
+            if self.outbox is None:
+                logger.warning(f'Message dispatcher is not started, message `{dispatch["message"].id}` not sent')
+                continue
+
+            self.outbox.put_nowait(dispatch)
+
+    async def start(self) -> None:
+        self.outbox = asyncio.Queue()
+        self.task = asyncio.create_task(self._drain(outbox=self.outbox))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.outbox = None
+
+    async def flush(self) -> None:
+        if self.outbox is not None:
+            await self.outbox.join()
+
+    async def _drain(self, outbox: asyncio.Queue[dict]) -> None:
+        while True:
+            dispatch: dict = await outbox.get()
+            try:
+                await self.websocket_manager.send_message(**dispatch)
+
+            except Exception as exc:
+                logger.error(f'Error while dispatching message `{dispatch["message"].id}`: {exc}')
+
+            finally:
+                outbox.task_done()
+
+
+message_dispatcher = MessageDispatcher(websocket_manager=websocket_manager)
@@ -1,21 +1,26 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime
 from uuid import UUID
 
 from fastapi_pagination import Page
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.configs.logging_settings import get_logger
-from app.crud.chat import chat_user_crud
-from app.crud.message import message_crud, message_user_read_crud
-from app.exceptions.conflict_409 import IntegrityException
+from app.crud.chat import chat_crud, chat_user_crud
+from app.crud.message import message_crud
+from app.exceptions.bad_request_400 import InvalidCursorException
+from app.exceptions.conflict_409 import MessageIdTakenException
+from app.exceptions.forbidden_403 import UserNotChatMemberException
 from app.exceptions.not_fount_404 import EntityNotFound
-from app.exceptions.not_implemented_501 import NotImplementedException
 from app.models.message import Message as MessageModel
-from app.schemas.chat import Chat, ChatType
-from app.schemas.message import Message, MessageCreate, MessageCreateRequest, MessageRequest, MessageUserReadCreate
+from app.schemas.chat import Chat
+from app.schemas.message import (HistoryDirection, Message, MessageCreate, MessageCreateRequest, MessageCursorPage,
+                                 MessageRequest, MessageSearchRequest)
 from app.services import chat_service
-from app.services.websocket_manager import websocket_manager
+from app.services.message_batcher import message_batcher
+from app.services.message_dispatcher import message_dispatcher
+from app.services.sent_message_cache import sent_message_cache
 
 logger = get_logger(__name__)
 
@@ -24,23 +29,73 @@ async def send_message(db: AsyncSession,
                        create_data: MessageCreateRequest,
                        current_user_id: int,
                        device_id: str) -> Message:
-    chat: Chat = await chat_service.get_chat(db=db, chat_id=create_data.chat_id, current_user_id=current_user_id)
-    chat_user_ids: list[int] = await chat_user_crud.get_chat_user_ids(db=db, chat_id=chat.id)
+    sent_message: Message | None = _get_sent_message(create_data=create_data, current_user_id=current_user_id)
+    if sent_message is not None:
+        return sent_message
+
     message_create: MessageCreate = MessageCreate(**create_data.model_dump(), sender_id=current_user_id)
-    try:
-        message_db: MessageModel = await message_crud.create(db=db, obj_in=message_create)
+    row: Row | None = await message_crud.create_in_chat(db=db, obj_in=message_create)
+    if row is None:
+        message: Message = await _get_not_inserted_message(db=db,
+                                                           create_data=create_data,
+                                                           current_user_id=current_user_id)
+        sent_message_cache.add_after_commit(db=db, message=message)
+        return message
+
+    message: Message = Message(**row._mapping, chat=Chat.model_validate(row.Chat))
+    sent_message_cache.add_after_commit(db=db, message=message)
+    message_dispatcher.dispatch_after_commit(db=db,
+                                             message=message,
+                                             chat_id=message.chat_id,
+                                             chat_user_ids=set(row.chat_user_ids),
+                                             device_id=device_id)
+    return message
 
-    except IntegrityError as exc:
-        raise IntegrityException(entity=MessageModel, exception=exc, logger=logger)
 
-    create_data: MessageUserReadCreate = MessageUserReadCreate(message_id=message_db.id, user_id=current_user_id)
-    await message_user_read_crud.create(db=db, obj_in=create_data)
+def _get_sent_message(create_data: MessageCreateRequest, current_user_id: int) -> Message | None:
+    """The message if `create_data` is a retry of a recently sent one."""
+    message: Message | None = sent_message_cache.get(message_id=create_data.id)
+    if message is None or message.sender_id != current_user_id or message.chat_id != create_data.chat_id:
+        return None
+
+    return message
+
+
+async def _get_not_inserted_message(db: AsyncSession,
+                                    create_data: MessageCreateRequest,
+                                    current_user_id: int) -> Message:
+    """
+    Resolves a send that inserted nothing: a retry of an already stored message returns that message,
+    anything else raises the reason.
+    """
+    message_db: MessageModel | None = await message_crud.get_or_none(db=db, id=create_data.id)
+    if message_db is not None:
+        if message_db.sender_id != current_user_id or message_db.chat_id != create_data.chat_id:
+            raise MessageIdTakenException(message_id=create_data.id, logger=logger)
+
+        message: Message = Message.model_validate(message_db)
+        return message
+
+    await chat_service.get_chat(db=db, chat_id=create_data.chat_id, current_user_id=current_user_id)
+    raise UserNotChatMemberException(user_id=current_user_id, chat_id=create_data.chat_id, logger=logger)
+
+
+async def send_message_batched(db: AsyncSession,
+                               create_data: MessageCreateRequest,
+                               current_user_id: int,
+                               device_id: str) -> Message:
+    """Sends the message through the group commit batcher, `db` is only used if the batch rejects the message."""
+    sent_message: Message | None = _get_sent_message(create_data=create_data, current_user_id=current_user_id)
+    if sent_message is not None:
+        return sent_message
+
+    message_create: MessageCreate = MessageCreate(**create_data.model_dump(), sender_id=current_user_id)
+    message: Message | None = await message_batcher.send(message_create=message_create, device_id=device_id)
+    if message is None:
+        # The single message path returns a retried message or reports why the message was rejected
+        message = await send_message(db=db, create_data=create_data, current_user_id=current_user_id,
+                                     device_id=device_id)
 
-    message: Message = Message.model_validate(message_db)
-    await websocket_manager.send_message(message=message,
-                                         chat_id=chat.id,
-                                         chat_user_ids=set(chat_user_ids),
-                                         device_id=device_id)
     return message
 
 
@@ -59,36 +114,88 @@ async def get_messages(db: AsyncSession, chat_id: int, request: MessageRequest)
     return messages
 
 
-async def read_message(db: AsyncSession, message_id: UUID, current_user_id: int) -> Message:
-    message: Message = await get_message(db=db, message_id=message_id)
-    chat_user_ids: list[int] = await chat_user_crud.get_chat_user_ids(db=db, chat_id=message.chat.id)
-    if current_user_id not in chat_user_ids:
-        return message
+async def search_messages(db: AsyncSession, request: MessageSearchRequest, current_user_id: int) -> Page[Message]:
+    messages_db: Page[MessageModel] = await message_crud.search_messages(db=db,
+                                                                         request=request,
+                                                                         user_id=current_user_id)
+    messages: Page[Message] = Page[Message].model_validate(messages_db)
+    return messages
 
-    match message.chat.type:
-        case ChatType.PRIVATE:
-            if message.sender_id != current_user_id:
-                message_db: MessageModel = await message_crud.update(db=db,
-                                                                     id=message_id,
-                                                                     obj_in={'read_at': datetime.now()})
-                message: Message = Message.model_validate(message_db)
-
-        case ChatType.GROUP:
-            user_ids_read_message: list[int] = await message_user_read_crud.get_user_ids_read_message(db=db,
-                                                                                                      message_id=message_id)
-            if current_user_id not in user_ids_read_message:
-                create_data: MessageUserReadCreate = MessageUserReadCreate(message_id=message_id,
-                                                                           user_id=current_user_id)
-                await message_user_read_crud.create(db=db, obj_in=create_data)
-                user_ids_read_message.append(current_user_id)
-
-            if set(user_ids_read_message) == set(chat_user_ids):
-                message_db: MessageModel = await message_crud.update(db=db,
-                                                                     id=message_id,
-                                                                     obj_in={'read_at': datetime.now()})
-                message: Message = Message.model_validate(message_db)
 
+async def get_messages_by_cursor(db: AsyncSession, chat_id: int, request: MessageRequest) -> MessageCursorPage:
+    cursor: tuple[datetime, UUID] | None = None if request.cursor is None else _decode_cursor(cursor=request.cursor)
+    # One extra row tells whether there is anything beyond this page
+    messages_db: list[MessageModel] = await message_crud.get_messages_by_cursor(db=db,
+                                                                                chat_id=chat_id,
+                                                                                request=request,
+                                                                                cursor=cursor,
+                                                                                limit=request.size + 1)
+    has_more: bool = len(messages_db) > request.size
+    messages: list[Message] = [Message.model_validate(message_db) for message_db in messages_db[:request.size]]
+
+    match request.direction:
+        case HistoryDirection.BEFORE:
+            messages.reverse()
+            has_before: bool = has_more
         case _:
-            raise NotImplementedException(log_message=f'Chat type {message.chat.type} not implemented', logger=logger)
+            has_before: bool = cursor is not None
 
-    return message
+    page: MessageCursorPage = MessageCursorPage(items=messages)
+    if len(messages) > 0:
+        page.before = _encode_cursor(message=messages[0]) if has_before else None
+        page.after = _encode_cursor(message=messages[-1])
+    else:
+        # Newer messages may still come after the cursor, so it is handed back to poll with
+        page.before = request.cursor if request.direction == HistoryDirection.AFTER else None
+        page.after = request.cursor
+    return page
+
+
+def _encode_cursor(message: Message) -> str:
+    return urlsafe_b64encode(f'{message.send_at.isoformat()}|{message.id}'.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        send_at, message_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(send_at), UUID(message_id)
+
+    except ValueError:
+        raise InvalidCursorException(cursor=cursor, logger=logger)
+
+
+async def get_messages_after(db: AsyncSession, chat_id: int, message_id: UUID, limit: int) -> list[Message]:
+    messages_db: list[MessageModel] = await message_crud.get_messages_after(db=db,
+                                                                            chat_id=chat_id,
+                                                                            message_id=message_id,
+                                                                            limit=limit)
+    messages: list[Message] = [Message.model_validate(message_db) for message_db in messages_db]
+    return messages
+
+
+async def read_messages(db: AsyncSession, message_ids: list[UUID], current_user_id: int) -> None:
+    # Reading is "read up to", so only the newest of the messages matters in every chat
+    last_send_at_by_chat: dict[int, datetime] = await message_crud.get_last_send_at_by_chat(
+        db=db, message_ids=message_ids
+    )
+    # Chats are locked until the batch commits, a fixed order keeps two sockets of the user from deadlocking
+    for chat_id in sorted(last_send_at_by_chat):
+        await _read_up_to(db=db,
+                          chat_id=chat_id,
+                          read_up_to=last_send_at_by_chat[chat_id],
+                          current_user_id=current_user_id)
+
+
+async def _read_up_to(db: AsyncSession, chat_id: int, read_up_to: datetime, current_user_id: int) -> None:
+    # Readers of a chat are serialized, otherwise the last two readers could both miss that everyone has read
+    await chat_crud.lock(db=db, chat_id=chat_id)
+    chat_user: Row | None = await chat_user_crud.mark_read_up_to(db=db,
+                                                                 chat_id=chat_id,
+                                                                 user_id=current_user_id,
+                                                                 read_up_to=read_up_to)
+    if chat_user is None:
+        return
+
+    read_after: datetime | None = chat_user.previous_read_up_to
+    if read_after is None or read_after < read_up_to:
+        await message_crud.mark_read_by_watermarks(db=db, chat_id=chat_id, read_up_to=read_up_to, read_after=read_after)
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import bcrypt
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import password_hasher_settings
+from app.schemas.password_hasher import PasswordHasherStats
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread pool, so a burst of logins does not block the event loop.
+
+    bcrypt releases the GIL, so at most `max_workers` hashes run in parallel and the rest wait in the pool queue.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers: int = max_workers
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix='password_hasher')
+        # Counters are updated from the pool threads
+        self.lock: threading.Lock = threading.Lock()
+        self.queued: int = 0
+        self.running: int = 0
+        self.completed: int = 0
+        self.total_wait_seconds: float = 0
+        self.max_wait_seconds: float = 0
+
+    async def hash(self, password: str) -> str:
+        hashed_password: bytes = await self._run(bcrypt.hashpw, password.encode(), bcrypt.gensalt())
+        return hashed_password.decode()
+
+    async def check(self, password: str, hashed_password: str) -> bool:
+        is_valid: bool = await self._run(bcrypt.checkpw, password.encode(), hashed_password.encode())
+        return is_valid
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        submitted_at: float = time.perf_counter()
+        with self.lock:
+            self.queued += 1
+
+        def run() -> T:
+            wait_seconds: float = time.perf_counter() - submitted_at
+            with self.lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_seconds += wait_seconds
+                self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            try:
+                return func(*args)
+
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+    def get_stats(self) -> PasswordHasherStats:
+        with self.lock:
+            stats: PasswordHasherStats = PasswordHasherStats(max_workers=self.max_workers,
+                                                             queued=self.queued,
+                                                             running=self.running,
+                                                             completed=self.completed,
+                                                             total_wait_seconds=self.total_wait_seconds,
+                                                             max_wait_seconds=self.max_wait_seconds)
+        return stats
+
+
+password_hasher = PasswordHasher(max_workers=password_hasher_settings.max_workers)
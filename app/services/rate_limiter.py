@@ -0,0 +1,177 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+
+import asyncpg
+from cachetools import LRUCache
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import database_settings, login_rate_limit_settings, RateLimiterBackendType
+from app.exceptions.too_many_requests_429 import TooManyLoginAttemptsException
+from app.schemas.rate_limit import LoginRateLimiterStats
+
+logger = get_logger(__name__)
+
+
+class BaseRateLimiterBackend(ABC):
+    """Storage of token buckets: a bucket holds up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        """Takes a token from the bucket of the key, False when the bucket is empty."""
+        pass
+
+
+class InMemoryRateLimiterBackend(BaseRateLimiterBackend):
+    """Buckets of one worker. The least recently used buckets are dropped (so refilled) above `max_keys`."""
+
+    def __init__(self, max_keys: int):
+        self.buckets: LRUCache = LRUCache(maxsize=max_keys)
+
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        now: float = time.monotonic()
+        tokens, updated_at = self.buckets.get(key, (burst, now))
+        tokens: float = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            return False
+
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+    def clear(self) -> None:
+        self.buckets.clear()
+
+
+class PostgresRateLimiterBackend(BaseRateLimiterBackend):
+    """
+    Buckets shared by every worker, kept in the unlogged `rate_limit_buckets` table.
+
+    A token is taken with one upsert, which refills the bucket and takes the token atomically. Buckets idle
+    for longer than `bucket_ttl` seconds are deleted in the background, a missing bucket is a full one.
+    """
+
+    take_query: str = '''
+        INSERT INTO rate_limit_buckets AS bucket (key, tokens, updated_at)
+        VALUES ($1, $3::float8 - 1, now())
+        ON CONFLICT (key) DO UPDATE
+        SET tokens = LEAST($3::float8, bucket.tokens + EXTRACT(EPOCH FROM now() - bucket.updated_at)::float8 * $2) - 1,
+            updated_at = now()
+        WHERE LEAST($3::float8, bucket.tokens + EXTRACT(EPOCH FROM now() - bucket.updated_at)::float8 * $2) >= 1
+        RETURNING tokens
+    '''
+
+    def __init__(self, dsn: str, bucket_ttl: float, pool_size: int = 4):
+        self.dsn: str = dsn
+        self.bucket_ttl: float = bucket_ttl
+        self.pool_size: int = pool_size
+        self.pool: asyncpg.Pool | None = None
+        self.cleanup_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self.pool = await asyncpg.create_pool(dsn=self.dsn, min_size=1, max_size=self.pool_size)
+        self.cleanup_task = asyncio.create_task(self._cleanup())
+
+    async def stop(self) -> None:
+        if self.cleanup_task is not None:
+            self.cleanup_task.cancel()
+            self.cleanup_task = None
+
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        async with self.pool.acquire() as connection:
+            tokens: float | None = await connection.fetchval(self.take_query, key, rate, burst)
+        return tokens is not None
+
+    async def _cleanup(self) -> None:
+        while True:
+            await asyncio.sleep(self.bucket_ttl)
+            try:
+                async with self.pool.acquire() as connection:
+                    await connection.execute('DELETE FROM rate_limit_buckets '
+                                             'WHERE updated_at < now() - make_interval(secs => $1)',
+                                             self.bucket_ttl)
+
+            except Exception as exc:
+                logger.error(f'Error while deleting idle rate limit buckets: {exc}')
+
+
+class LoginRateLimiter:
+    """
+    Throttles login attempts per client address and per username before any user lookup or bcrypt check.
+
+    The address bucket is checked first, so attempts rejected by it do not drain the bucket of the username.
+    """
+
+    def __init__(self,
+                 backend: BaseRateLimiterBackend,
+                 username_rate: float,
+                 username_burst: int,
+                 address_rate: float,
+                 address_burst: int,
+                 enabled: bool = True):
+        self.backend: BaseRateLimiterBackend = backend
+        self.username_rate: float = username_rate
+        self.username_burst: int = username_burst
+        self.address_rate: float = address_rate
+        self.address_burst: int = address_burst
+        self.enabled: bool = enabled
+
+        self.allowed: int = 0
+        self.rejected_by_address: int = 0
+        self.rejected_by_username: int = 0
+
+    async def start(self) -> None:
+        await self.backend.start()
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+
+    async def check(self, username: str, address: str | None) -> None:
+        if not self.enabled:
+            return
+
+        if address is not None:
+            key: str = f'address:{address}'
+            if not await self.backend.take(key=key, rate=self.address_rate, burst=self.address_burst):
+                self.rejected_by_address += 1
+                raise TooManyLoginAttemptsException(key=key, logger=logger)
+
+        key: str = f'username:{username}'
+        if not await self.backend.take(key=key, rate=self.username_rate, burst=self.username_burst):
+            self.rejected_by_username += 1
+            raise TooManyLoginAttemptsException(key=key, logger=logger)
+
+        self.allowed += 1
+
+    def get_stats(self) -> LoginRateLimiterStats:
+        stats: LoginRateLimiterStats = LoginRateLimiterStats(allowed=self.allowed,
+                                                             rejected_by_address=self.rejected_by_address,
+                                                             rejected_by_username=self.rejected_by_username)
+        return stats
+
+
+def get_rate_limiter_backend() -> BaseRateLimiterBackend:
+    match login_rate_limit_settings.backend:
+        case RateLimiterBackendType.POSTGRES:
+            return PostgresRateLimiterBackend(dsn=database_settings.db_asyncpg_url(),
+                                              bucket_ttl=login_rate_limit_settings.bucket_ttl,
+                                              pool_size=login_rate_limit_settings.pool_size)
+        case _:
+            return InMemoryRateLimiterBackend(max_keys=login_rate_limit_settings.max_keys)
+
+
+login_rate_limiter = LoginRateLimiter(backend=get_rate_limiter_backend(),
+                                      username_rate=login_rate_limit_settings.username_rate,
+                                      username_burst=login_rate_limit_settings.username_burst,
+                                      address_rate=login_rate_limit_settings.address_rate,
+                                      address_burst=login_rate_limit_settings.address_burst,
+                                      enabled=login_rate_limit_settings.enabled)
@@ -0,0 +1,33 @@
+from collections import deque
+from uuid import UUID
+
+from cachetools import LRUCache
+
+
+class ReplayBuffer:
+    """
+    Last messages of recently active chats, kept as the already encoded payloads sent to websockets.
+
+    Used to replay the gap to a reconnecting client without a DB query. Only `max_messages` per chat
+    and `max_chats` chats are kept, least recently written chats are dropped first.
+    """
+
+    def __init__(self, max_chats: int, max_messages: int):
+        self.max_messages: int = max_messages
+        self.chats: LRUCache = LRUCache(maxsize=max_chats)
+
+    def append(self, chat_id: int, message_id: UUID, payload: str) -> None:
+        messages: deque[tuple[UUID, str]] | None = self.chats.get(chat_id, None)
+        if messages is None:
+            messages = deque(maxlen=self.max_messages)
+            self.chats[chat_id] = messages
+        messages.append((message_id, payload))
+
+    def get_after(self, chat_id: int, message_id: UUID) -> list[str] | None:
+        """Payloads sent after `message_id`, None if the buffer does not reach back to it."""
+        messages: deque[tuple[UUID, str]] = self.chats.get(chat_id, deque())
+        for index, (buffered_message_id, _) in enumerate(messages):
+            if buffered_message_id == message_id:
+                return [payload for _, payload in list(messages)[index + 1:]]
+
+        return None
@@ -0,0 +1,39 @@
+from uuid import UUID
+
+from cachetools import TTLCache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.configs.settings import sent_message_cache_settings
+from app.db.post_commit import PostCommitHook
+from app.schemas.message import Message
+
+
+class SentMessageCache:
+    """
+    Recently sent messages by id, so a retried send gets the original message back without a DB query.
+
+    Messages get into the cache only once their session commits, a rolled back message is never returned.
+    Entries expire after `ttl` seconds; on a miss the send path finds the message in the DB instead.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.messages: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self.post_commit: PostCommitHook = PostCommitHook(callback=self._after_commit)
+
+    def add_after_commit(self, db: AsyncSession, message: Message) -> None:
+        self.post_commit.add(db=db, value=message)
+
+    def _after_commit(self, messages: list[Message]) -> None:
+        for message in messages:
+            self.messages[message.id] = message
+
+    def get(self, message_id: UUID) -> Message | None:
+        message: Message | None = self.messages.get(message_id)
+        return message
+
+    def clear(self) -> None:
+        self.messages.clear()
+
+
+sent_message_cache = SentMessageCache(max_size=sent_message_cache_settings.max_size,
+                                      ttl=sent_message_cache_settings.ttl)
@@ -0,0 +1,12 @@
+from app.schemas.stats import Stats
+from app.services.password_hasher import password_hasher
+from app.services.rate_limiter import login_rate_limiter
+from app.services.websocket_manager import websocket_manager
+
+
+def get_stats() -> Stats:
+    # Counters of this worker only, each worker serves its own
+    stats: Stats = Stats(websocket=websocket_manager.get_stats(),
+                         password_hasher=password_hasher.get_stats(),
+                         login_rate_limiter=login_rate_limiter.get_stats())
+    return stats
@@ -1,4 +1,3 @@
-import bcrypt
 from fastapi_pagination import Page
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,12 +8,13 @@ from app.exceptions.conflict_409 import IntegrityException
 from app.exceptions.not_fount_404 import EntityNotFound
 from app.models.user import User as UserModel
 from app.schemas.user import User, UserCreate, UserCreateRequest, UserRequest
+from app.services.password_hasher import password_hasher
 
 logger = get_logger(__name__)
 
 
 async def create_user(db: AsyncSession, create_data: UserCreateRequest) -> User:
-    hashed_password: str = bcrypt.hashpw(create_data.password.encode(), bcrypt.gensalt()).decode()
+    hashed_password: str = await password_hasher.hash(password=create_data.password)
     create_data: UserCreate = UserCreate(username=create_data.username, password=hashed_password)
     try:
         user_db: UserModel = await user_crud.create(db=db, obj_in=create_data)
@@ -1,72 +1,255 @@
 import asyncio
+import time
+from uuid import UUID
 
-from cachetools import LFUCache
+from starlette import status
 from starlette.websockets import WebSocket, WebSocketDisconnect
 from websockets import ConnectionClosedOK
 
 from app.configs.logging_settings import get_logger
+from app.configs.settings import OverflowPolicyType, websocket_settings
 from app.schemas.message import Message
+from app.schemas.websocket import MessageEvent, WebsocketFrame, WebsocketFrameType, WebsocketStats
+from app.services.connection_registry import Connection, ConnectionRegistry
+from app.services.message_bus import BaseMessageBus, message_bus
+from app.services.replay_buffer import ReplayBuffer
 
 logger = get_logger(__name__)
 
+MESSAGES_CHANNEL = 'messages'
+PING_PAYLOAD: str = WebsocketFrame(type=WebsocketFrameType.PING).model_dump_json(include={'type'})
 
-class WebsocketManager:
-    def __init__(self, max_connections: int = 1000):
-        self.connections = LFUCache(maxsize=max_connections)
-        self.chat_index: dict[int, set[tuple[int, str]]] = {}
 
-    async def connect(self, websocket: WebSocket, chat_id: int, user_id: int, device_id: str) -> None:
+class WebsocketManager:
+    def __init__(self,
+                 message_bus: BaseMessageBus,
+                 max_connections: int = 1000,
+                 queue_size: int = 100,
+                 overflow_policy: OverflowPolicyType = OverflowPolicyType.DROP_OLDEST,
+                 heartbeat_interval: float = 30,
+                 heartbeat_timeout: float = 90,
+                 replay_buffer_size: int = 50,
+                 replay_buffer_chats: int = 10000):
+        self.registry: ConnectionRegistry = ConnectionRegistry(max_connections=max_connections)
+
+        self.queue_size: int = queue_size
+        self.overflow_policy: OverflowPolicyType = overflow_policy
+        self.dropped_messages: int = 0
+        self.evicted_connections: int = 0
+        self.rejected_connections: int = 0
+        self.background_tasks: set[asyncio.Task] = set()
+
+        self.heartbeat_interval: float = heartbeat_interval
+        self.heartbeat_timeout: float = heartbeat_timeout
+        self.heartbeat_task: asyncio.Task | None = None
+        self.reaped_connections: int = 0
+
+        self.replay_buffer: ReplayBuffer = ReplayBuffer(max_chats=replay_buffer_chats, max_messages=replay_buffer_size)
+        self.replay_hits: int = 0
+        self.replay_misses: int = 0
+
+        self.message_bus: BaseMessageBus = message_bus
+        self.message_bus.subscribe(channel=MESSAGES_CHANNEL, handler=self._on_message_event)
+
+    async def connect(self,
+                      websocket: WebSocket,
+                      user_id: int,
+                      device_id: str,
+                      chat_id: int | None = None) -> Connection | None:
+        """Returns None if the worker is full, the socket is then closed with `1013 Try Again Later`."""
         await websocket.accept()
-        key: tuple = (chat_id, user_id, device_id)
-        self.connections[key] = websocket
+        connection: Connection = Connection(websocket=websocket,
+                                            user_id=user_id,
+                                            device_id=device_id,
+                                            chat_id=chat_id,
+                                            queue_size=self.queue_size)
+        previous_connection: Connection | None = self.registry.get(connection.key)
+        if previous_connection is not None:
+            self.disconnect(connection=previous_connection)
+
+        if not self.registry.add(connection):
+            self.rejected_connections += 1
+            await self._close(websocket=websocket, code=status.WS_1013_TRY_AGAIN_LATER)
+            logger.warning(f'Connection `{connection.key}` rejected, '
+                           f'limit of {self.registry.max_connections} connections is reached')
+            return None
+
+        connection.writer_task = asyncio.create_task(self._write(connection=connection))
+
+        logger.debug(f'User `{user_id}` connected from device `{device_id}`, chat_id `{chat_id}`')
+        return connection
 
-        if chat_id not in self.chat_index:
-            self.chat_index[chat_id] = set()
-        self.chat_index[chat_id].add((user_id, device_id))
+    def disconnect(self, connection: Connection) -> None:
+        if not self.registry.remove(connection):
+            return
 
-        logger.debug(f'User `{user_id}` connected to chat_id `{chat_id}` from device `{device_id}`')
+        self._stop_writer(connection)
 
-    def disconnect(self, chat_id: int, user_id: int, device_id: str) -> None:
-        key: tuple = (chat_id, user_id, device_id)
-        websocket: WebSocket | None = self.connections.pop(key, None)
-        if websocket is not None:
-            logger.debug(f'User `{user_id}` with device `{device_id}` disconnected from chat_id `{chat_id}`')
+        logger.debug(f'User `{connection.user_id}` with device `{connection.device_id}` disconnected, '
+                     f'chat_id `{connection.key[2]}`')
 
-        if chat_id in self.chat_index:
-            self.chat_index[chat_id].discard((user_id, device_id))
-            if len(self.chat_index[chat_id]) == 0:
-                self.chat_index.pop(chat_id)
+    def subscribe(self, connection: Connection, chat_ids: set[int]) -> None:
+        self.registry.subscribe(connection=connection, chat_ids=chat_ids)
+
+    def unsubscribe(self, connection: Connection, chat_ids: set[int]) -> None:
+        self.registry.unsubscribe(connection=connection, chat_ids=chat_ids)
+
+    def get_user_connections(self, user_id: int) -> list[Connection]:
+        return self.registry.get_user_connections(user_id=user_id)
 
     @staticmethod
-    async def _send(message: Message, websocket: WebSocket) -> bool:
-        try:
-            await websocket.send_json(message.model_dump(mode='json'))
-            return True
+    def _stop_writer(connection: Connection) -> None:
+        if connection.writer_task is not None and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
 
-        except (ConnectionClosedOK, RuntimeError, WebSocketDisconnect):
-            return False
+    async def _write(self, connection: Connection) -> None:
+        while True:
+            payload: str = await connection.queue.get()
+            try:
+                await connection.websocket.send_text(payload)
 
-    async def send_message(self, message: Message, chat_id: int, chat_user_ids: set[int], device_id: str) -> None:
-        keys: set[tuple[int, str]] = self.chat_index.get(chat_id, set())
-        tasks: list[tuple] = []
-        keys_to_remove: list[tuple] = []
+            except (ConnectionClosedOK, RuntimeError, WebSocketDisconnect):
+                self.disconnect(connection=connection)
+                return
 
-        for connection_user_id, connection_device_id in keys:
-            if connection_user_id in chat_user_ids and connection_device_id != device_id:
-                key: tuple = (chat_id, connection_user_id, connection_device_id)
-                websocket: WebSocket | None = self.connections.get(key, None)
-                if websocket is not None:
-                    tasks.append((key, websocket, self._send(message=message, websocket=websocket)))
+            finally:
+                connection.queue.task_done()
 
-        if len(tasks) > 0:
-            results = await asyncio.gather(*(task for _, _, task in tasks))
-            for (key, _, _), success in zip(tasks, results):
-                if not success:
-                    keys_to_remove.append(key)
+    def send_frame(self, connection: Connection, payload: str) -> None:
+        self._enqueue(connection=connection, payload=payload)
 
-        for key in keys_to_remove:
-            chat_id_key, connection_user_id, connection_device_id = key
-            self.disconnect(chat_id=chat_id_key, user_id=connection_user_id, device_id=connection_device_id)
+    def _enqueue(self, connection: Connection, payload: str) -> None:
+        try:
+            connection.queue.put_nowait(payload)
+            return
+
+        except asyncio.QueueFull:
+            pass
+
+        match self.overflow_policy:
+            case OverflowPolicyType.DROP_OLDEST:
+                connection.queue.get_nowait()
+                connection.queue.task_done()
+                connection.queue.put_nowait(payload)
+                self.dropped_messages += 1
+
+            case OverflowPolicyType.DISCONNECT:
+                self.disconnect(connection=connection)
+                self.evicted_connections += 1
+                self._close_in_background(websocket=connection.websocket, code=status.WS_1008_POLICY_VIOLATION)
+                logger.warning(f'Slow consumer `{connection.key}` evicted, outbound queue is full')
+
+    def _close_in_background(self, websocket: WebSocket, code: int) -> None:
+        close_task: asyncio.Task = asyncio.create_task(self._close(websocket=websocket, code=code))
+        self.background_tasks.add(close_task)
+        close_task.add_done_callback(self.background_tasks.discard)
 
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
 
-websocket_manager = WebsocketManager(max_connections=1000)
+        except (ConnectionClosedOK, RuntimeError, WebSocketDisconnect):
+            pass
+
+    @staticmethod
+    def touch(connection: Connection) -> None:
+        connection.last_seen_at = time.monotonic()
+
+    async def start(self) -> None:
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    def _heartbeat_connections(self) -> list[Connection]:
+        # Chat sockets only ever carried messages and their clients never answer a ping, they are left
+        # to the protocol level ping of uvicorn
+        return [connection for connection in self.registry.values() if connection.key[2] is None]
+
+    async def _heartbeat(self) -> None:
+        # A successful send proves nothing for a half-open TCP connection, only frames from the client do
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.reap()
+            for connection in self._heartbeat_connections():
+                self._enqueue(connection=connection, payload=PING_PAYLOAD)
+
+    def reap(self) -> int:
+        stale_before: float = time.monotonic() - self.heartbeat_timeout
+        stale_connections: list[Connection] = [connection for connection in self._heartbeat_connections()
+                                               if connection.last_seen_at < stale_before]
+        for connection in stale_connections:
+            self.disconnect(connection=connection)
+            self._close_in_background(websocket=connection.websocket, code=status.WS_1001_GOING_AWAY)
+
+        self.reaped_connections += len(stale_connections)
+        if len(stale_connections) > 0:
+            logger.info(f'Reaped {len(stale_connections)} websocket connections without heartbeat')
+        return len(stale_connections)
+
+    async def stop(self) -> None:
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+        connections: list[Connection] = self.registry.values()
+        for connection in connections:
+            self.disconnect(connection=connection)
+
+        await asyncio.gather(*(connection.writer_task for connection in connections), return_exceptions=True)
+
+    async def flush(self) -> None:
+        await asyncio.gather(*(connection.queue.join() for connection in self.registry.values()))
+
+    async def send_message(self, message: Message, chat_id: int, chat_user_ids: set[int], device_id: str) -> None:
+        # The message is encoded once here and the very same text frame is reused for every recipient
+        event: MessageEvent = MessageEvent(message_id=message.id,
+                                           chat_id=chat_id,
+                                           chat_user_ids=chat_user_ids,
+                                           device_id=device_id)
+        payload: str = f'{event.model_dump_json()}\n{message.model_dump_json()}'
+        await self.message_bus.publish(channel=MESSAGES_CHANNEL, payload=payload)
+
+    async def _on_message_event(self, payload: str) -> None:
+        event_json, message_json = payload.split('\n', 1)
+        event: MessageEvent = MessageEvent.model_validate_json(event_json)
+        self.replay_buffer.append(chat_id=event.chat_id, message_id=event.message_id, payload=message_json)
+        self._deliver(payload=message_json,
+                      chat_id=event.chat_id,
+                      chat_user_ids=event.chat_user_ids,
+                      device_id=event.device_id)
+
+    def _deliver(self, payload: str, chat_id: int, chat_user_ids: set[int], device_id: str) -> None:
+        # Only puts the payload into the recipients' queues, sockets are written by their own writer tasks
+        for connection in self.registry.get_chat_connections(chat_id=chat_id):
+            if connection.user_id in chat_user_ids and connection.device_id != device_id:
+                self._enqueue(connection=connection, payload=payload)
+
+    def get_missed_messages(self, chat_id: int, message_id: UUID) -> list[str] | None:
+        payloads: list[str] | None = self.replay_buffer.get_after(chat_id=chat_id, message_id=message_id)
+        if payloads is None:
+            self.replay_misses += 1
+        else:
+            self.replay_hits += 1
+        return payloads
+
+    def get_stats(self) -> WebsocketStats:
+        queue_depths: list[int] = [connection.queue.qsize() for connection in self.registry.values()]
+        stats: WebsocketStats = WebsocketStats(connections=len(queue_depths),
+                                               queued_messages=sum(queue_depths),
+                                               max_queue_depth=max(queue_depths, default=0),
+                                               dropped_messages=self.dropped_messages,
+                                               evicted_connections=self.evicted_connections,
+                                               rejected_connections=self.rejected_connections,
+                                               reaped_connections=self.reaped_connections,
+                                               replay_hits=self.replay_hits,
+                                               replay_misses=self.replay_misses)
+        return stats
+
+
+websocket_manager = WebsocketManager(message_bus=message_bus,
+                                     max_connections=websocket_settings.max_connections,
+                                     queue_size=websocket_settings.outbound_queue_size,
+                                     overflow_policy=websocket_settings.overflow_policy,
+                                     heartbeat_interval=websocket_settings.heartbeat_interval,
+                                     heartbeat_timeout=websocket_settings.heartbeat_timeout,
+                                     replay_buffer_size=websocket_settings.replay_buffer_size,
+                                     replay_buffer_chats=websocket_settings.replay_buffer_chats)
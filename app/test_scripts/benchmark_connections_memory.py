@@ -0,0 +1,62 @@
+import asyncio
+import gc
+import logging
+import tracemalloc
+
+from app.configs.logging_settings import get_logger
+from app.services.message_bus import InMemoryMessageBus
+from app.services.websocket_manager import WebsocketManager
+
+logger = get_logger(__name__)
+logging.getLogger('app.services.websocket_manager').setLevel(logging.INFO)
+
+CONNECTIONS: int = 100_000
+CHATS_PER_CONNECTION: int = 5
+CHATS: int = 10_000
+
+
+class NullWebsocket:
+    __slots__ = ()
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+
+async def main() -> None:
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(), max_connections=CONNECTIONS)
+    websockets: list[NullWebsocket] = [NullWebsocket() for _ in range(CONNECTIONS)]
+
+    gc.collect()
+    tracemalloc.start()
+    started_size, _ = tracemalloc.get_traced_memory()
+
+    for user_id, websocket in enumerate(websockets):
+        connection = await manager.connect(websocket=websocket, user_id=user_id, device_id='device')
+        manager.subscribe(connection=connection,
+                          chat_ids={(user_id + i * 7) % CHATS for i in range(CHATS_PER_CONNECTION)})
+    # Let every writer task reach its first queue.get()
+    await asyncio.sleep(0)
+
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total: int = size - started_size
+    logger.info(f'{len(manager.registry)} connections, {CHATS_PER_CONNECTION} chats each: '
+                f'{total / 2 ** 20:.1f} MiB total, {total / CONNECTIONS:.0f} bytes per connection '
+                f'(peak {peak / 2 ** 20:.1f} MiB)')
+
+    rejected = await manager.connect(websocket=NullWebsocket(), user_id=CONNECTIONS, device_id='device')
+    logger.info(f'Connection over the limit admitted: {rejected is not None}')
+
+    await manager.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
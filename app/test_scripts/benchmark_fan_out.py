@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from app.configs.logging_settings import get_logger
+from app.schemas.chat import Chat, ChatType
+from app.schemas.message import Message
+from app.services.message_bus import InMemoryMessageBus
+from app.services.websocket_manager import WebsocketManager
+
+logger = get_logger(__name__)
+logging.getLogger('app.services.websocket_manager').setLevel(logging.INFO)
+
+GROUP_SIZES: list[int] = [10, 100, 500, 2000]
+ROUNDS: int = 50
+
+
+class NullWebsocket:
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+
+def _message(chat_id: int) -> Message:
+    return Message(id=uuid4(), chat_id=chat_id, sender_id=0, text='benchmark message ' * 20, send_at=datetime.now(),
+                   chat=Chat(id=chat_id, name='benchmark group', type=ChatType.GROUP))
+
+
+async def _encode_per_recipient(message: Message, websockets: list[NullWebsocket]) -> None:
+    # What every recipient used to cost: model_dump + json.dumps (as in WebSocket.send_json) per socket
+    await asyncio.gather(*(websocket.send_text(json.dumps(message.model_dump(mode='json'),
+                                                          separators=(',', ':'),
+                                                          ensure_ascii=False))
+                           for websocket in websockets))
+
+
+async def benchmark(group_size: int) -> None:
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(), max_connections=group_size + 1)
+    websockets: list[NullWebsocket] = []
+    for user_id in range(1, group_size + 1):
+        websocket: NullWebsocket = NullWebsocket()
+        await manager.connect(websocket=websocket, chat_id=1, user_id=user_id, device_id=str(user_id))
+        websockets.append(websocket)
+    chat_user_ids: set[int] = set(range(group_size + 1))
+
+    started_at: float = time.perf_counter()
+    for _ in range(ROUNDS):
+        await _encode_per_recipient(message=_message(chat_id=1), websockets=websockets)
+    per_recipient_before: float = (time.perf_counter() - started_at) / ROUNDS / group_size
+
+    started_at: float = time.perf_counter()
+    for _ in range(ROUNDS):
+        await manager.send_message(message=_message(chat_id=1), chat_id=1, chat_user_ids=chat_user_ids, device_id='0')
+        await manager.flush()
+    per_recipient_after: float = (time.perf_counter() - started_at) / ROUNDS / group_size
+
+    logger.info(f'{group_size:>5} recipients: '
+                f'encode per recipient {per_recipient_before * 1e6:7.2f} us/recipient, '
+                f'send_message {per_recipient_after * 1e6:7.2f} us/recipient')
+
+
+async def main() -> None:
+    for group_size in GROUP_SIZES:
+        await benchmark(group_size=group_size)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import bcrypt
+
+from app.configs.logging_settings import get_logger
+from app.configs.settings import password_hasher_settings
+from app.services.password_hasher import PasswordHasher
+
+logger = get_logger(__name__)
+
+LOGINS: int = 100
+TICK: float = 0.01
+
+
+async def _measure_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    # How late the loop wakes a sleeper is how long every websocket of the worker waits too
+    while not stop.is_set():
+        started_at: float = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started_at - TICK)
+
+
+async def _checkpw_inline(password: str, hashed_password: str) -> bool:
+    # What auth_service.login used to do
+    return bcrypt.checkpw(password.encode(), hashed_password.encode())
+
+
+async def benchmark(name: str, check) -> None:
+    hashed_password: str = bcrypt.hashpw('password'.encode(), bcrypt.gensalt()).decode()
+    stop: asyncio.Event = asyncio.Event()
+    lags: list[float] = []
+    lag_task: asyncio.Task = asyncio.create_task(_measure_lag(stop=stop, lags=lags))
+    await asyncio.sleep(TICK)
+
+    started_at: float = time.perf_counter()
+    await asyncio.gather(*(check(password='password', hashed_password=hashed_password) for _ in range(LOGINS)))
+    elapsed: float = time.perf_counter() - started_at
+    stop.set()
+    await lag_task
+
+    lags.sort()
+    logger.info(f'{name:>8}: {LOGINS} logins in {elapsed:6.2f} s, event loop lag '
+                f'p50 {lags[len(lags) // 2] * 1000:8.1f} ms, '
+                f'p99 {lags[int(len(lags) * 0.99)] * 1000:8.1f} ms, '
+                f'max {lags[-1] * 1000:8.1f} ms')
+
+
+async def main() -> None:
+    await benchmark(name='inline', check=_checkpw_inline)
+    password_hasher: PasswordHasher = PasswordHasher(max_workers=password_hasher_settings.max_workers)
+    await benchmark(name='pool', check=password_hasher.check)
+    logger.info(f'pool stats: {password_hasher.get_stats()}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import time
+
+from fastapi_pagination import Page
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import select, Select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.configs.logging_settings import get_logger
+from app.crud.message import message_crud
+from app.db.postgres import session_maker
+from app.models.chat import ChatUser
+from app.models.message import Message
+from app.schemas.message import MessageSearchRequest
+
+logger = get_logger(__name__)
+
+MESSAGES: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+CHATS: int = 1000
+BATCH_SIZE: int = 1_000_000
+ROUNDS: int = 10
+TERMS: list[str] = ['word42', 'word4242 word42', 'nothingmatches']
+
+
+async def seed() -> int:
+    async with session_maker.begin() as db:
+        user_id: int = (await db.execute(text("INSERT INTO users (username) VALUES ('search_' || gen_random_uuid()) "
+                                              "RETURNING id"))).scalar_one()
+        first_chat_id: int = (await db.execute(text(
+            "INSERT INTO chats (name, type) SELECT 'search_' || gen_random_uuid(), 'GROUP' "
+            "FROM generate_series(1, CAST(:chats AS integer)) RETURNING id"
+        ), {'chats': CHATS})).scalars().all()[0]
+        await db.execute(text('INSERT INTO chat_users (chat_id, user_id) '
+                              'SELECT id, :user_id FROM chats WHERE id >= :first_chat_id'),
+                         {'user_id': user_id, 'first_chat_id': first_chat_id})
+
+    for offset in range(0, MESSAGES, BATCH_SIZE):
+        async with session_maker.begin() as db:
+            await db.execute(text(
+                "INSERT INTO messages (id, chat_id, sender_id, text) "
+                "SELECT gen_random_uuid(), :first_chat_id + i % :chats, :user_id, "
+                "       concat_ws(' ', 'word' || i % 1000, 'word' || i * 7 % 10007, md5(i::text)) "
+                "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i"
+            ), {'first_chat_id': first_chat_id, 'chats': CHATS, 'user_id': user_id,
+                'start': offset, 'stop': min(offset + BATCH_SIZE, MESSAGES) - 1})
+        logger.info(f'Seeded {min(offset + BATCH_SIZE, MESSAGES)} messages')
+
+    async with session_maker() as db:
+        await db.execute(text('ANALYZE messages'))
+    return user_id
+
+
+async def search_ilike(db: AsyncSession, request: MessageSearchRequest, user_id: int) -> Page[Message]:
+    # What search cost before the tsvector index
+    user_chat_ids: Select = select(ChatUser.chat_id).where(ChatUser.user_id == user_id)
+    query: Select = (select(Message)
+                     .where(Message.chat_id.in_(user_chat_ids))
+                     .where(Message.text.ilike(f'%{request.query}%'))
+                     .order_by(Message.send_at.desc()))
+    return await paginate(db, query, request)
+
+
+async def benchmark(search, user_id: int, term: str) -> tuple[float, int]:
+    request: MessageSearchRequest = MessageSearchRequest(query=term)
+    async with session_maker() as db:
+        started_at: float = time.perf_counter()
+        for _ in range(ROUNDS):
+            page: Page = await search(db=db, request=request, user_id=user_id)
+    return (time.perf_counter() - started_at) / ROUNDS, page.total
+
+
+async def main() -> None:
+    user_id: int = await seed()
+    for term in TERMS:
+        fts_time, fts_total = await benchmark(message_crud.search_messages, user_id=user_id, term=term)
+        ilike_time, ilike_total = await benchmark(search_ilike, user_id=user_id, term=term)
+        logger.info(f'{MESSAGES} messages, `{term}`: full-text {fts_time * 1e3:8.2f} ms ({fts_total} found), '
+                    f'ilike {ilike_time * 1e3:8.2f} ms ({ilike_total} found)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
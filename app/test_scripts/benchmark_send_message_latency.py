@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import statistics
+import time
+from uuid import uuid4
+
+import bcrypt
+from httpx import ASGITransport, AsyncClient
+
+from app.api.deps import get_user_id
+from app.configs.logging_settings import get_logger
+from app.crud.chat import chat_user_crud
+from app.crud.user import user_crud
+from app.db.postgres import session_maker
+from app.main import app
+from app.models.user import User as UserModel
+from app.schemas.chat import ChatUserCreate
+from app.schemas.group import Group, GroupCreateRequest
+from app.schemas.user import UserCreate
+from app.services import group_service
+from app.services.message_bus import message_bus
+from app.services.message_dispatcher import message_dispatcher
+from app.services.websocket_manager import websocket_manager
+
+logger = get_logger(__name__)
+logging.getLogger('app.services.websocket_manager').setLevel(logging.INFO)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+GROUP_SIZE: int = 200
+REQUESTS: int = 500
+
+
+class NullWebsocket:
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        # Yield like a real socket write would
+        await asyncio.sleep(0)
+
+
+async def create_group() -> tuple[int, list[int]]:
+    async with session_maker.begin() as db:
+        hashed_password: str = bcrypt.hashpw('password'.encode(), bcrypt.gensalt(rounds=4)).decode()
+        users_create_data: list[UserCreate] = [UserCreate(username=f'latency_{uuid4().hex}', password=hashed_password)
+                                               for _ in range(GROUP_SIZE)]
+        users_db: list[UserModel] = await user_crud.create_batch(db=db, objs_in=users_create_data)
+        user_ids: list[int] = [user_db.id for user_db in users_db]
+
+        create_data: GroupCreateRequest = GroupCreateRequest(name=f'latency group {uuid4().hex}')
+        group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user_ids[0])
+        await chat_user_crud.create_batch(db=db, objs_in=[ChatUserCreate(chat_id=group.chat_id, user_id=user_id)
+                                                          for user_id in user_ids[1:]])
+    return group.chat_id, user_ids
+
+
+def percentile(latencies: list[float], percent: int) -> float:
+    return statistics.quantiles(latencies, n=100)[percent - 1]
+
+
+async def main() -> None:
+    chat_id, user_ids = await create_group()
+    for user_id in user_ids:
+        await websocket_manager.connect(websocket=NullWebsocket(), user_id=user_id, device_id='device', chat_id=chat_id)
+
+    app.dependency_overrides[get_user_id] = lambda: user_ids[0]
+    await message_bus.start()
+    await message_dispatcher.start()
+
+    response_latencies: list[float] = []
+    delivery_latencies: list[float] = []
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://benchmark') as client:
+        for _ in range(REQUESTS):
+            started_at: float = time.perf_counter()
+            response = await client.post('/messages',
+                                         json={'id': str(uuid4()), 'chat_id': chat_id, 'text': 'benchmark message'},
+                                         headers={'device-id': 'sender'})
+            response_latencies.append(time.perf_counter() - started_at)
+            response.raise_for_status()
+
+            # Response plus fan-out, which is what a request used to cost before the dispatch was moved off it
+            await message_dispatcher.flush()
+            await websocket_manager.flush()
+            delivery_latencies.append(time.perf_counter() - started_at)
+
+    logger.info(f'POST /messages to a {GROUP_SIZE}-member group, {REQUESTS} requests: '
+                f'response p50 {percentile(response_latencies, 50) * 1e3:.2f} ms, '
+                f'p99 {percentile(response_latencies, 99) * 1e3:.2f} ms; '
+                f'response with fan-out p50 {percentile(delivery_latencies, 50) * 1e3:.2f} ms, '
+                f'p99 {percentile(delivery_latencies, 99) * 1e3:.2f} ms')
+
+    await message_dispatcher.stop()
+    await websocket_manager.stop()
+    await message_bus.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Read watermarks
+
+Revision ID: a87743f033e9
+Revises: f77770ac4d20
+Create Date: 2026-10-17 13:00:12.371254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a87743f033e9'
+down_revision: Union[str, None] = 'f77770ac4d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_users', sa.Column('read_up_to', sa.DateTime(), nullable=True))
+
+    # Messages read by everyone move the watermark of every member except the sender
+    op.execute('''
+        UPDATE chat_users
+        SET read_up_to = read.read_up_to
+        FROM (SELECT chat_users.chat_id, chat_users.user_id, max(messages.send_at) AS read_up_to
+              FROM messages
+              JOIN chat_users ON chat_users.chat_id = messages.chat_id AND chat_users.user_id != messages.sender_id
+              WHERE messages.read_at IS NOT NULL
+              GROUP BY chat_users.chat_id, chat_users.user_id) AS read
+        WHERE chat_users.chat_id = read.chat_id AND chat_users.user_id = read.user_id
+    ''')
+    # Group messages read only by some of the members
+    op.execute('''
+        UPDATE chat_users
+        SET read_up_to = greatest(chat_users.read_up_to, read.read_up_to)
+        FROM (SELECT messages.chat_id, message_users_read.user_id, max(messages.send_at) AS read_up_to
+              FROM message_users_read
+              JOIN messages ON messages.id = message_users_read.message_id
+              WHERE message_users_read.user_id != messages.sender_id
+              GROUP BY messages.chat_id, message_users_read.user_id) AS read
+        WHERE chat_users.chat_id = read.chat_id AND chat_users.user_id = read.user_id
+    ''')
+
+    op.drop_table('message_users_read')
+
+
+def downgrade() -> None:
+    op.create_table('message_users_read',
+    sa.Column('message_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('message_id', 'user_id'),
+    sa.UniqueConstraint('message_id', 'user_id', name='message_user_read_unique')
+    )
+    op.execute('''
+        INSERT INTO message_users_read (message_id, user_id)
+        SELECT messages.id, chat_users.user_id
+        FROM messages
+        JOIN chat_users ON chat_users.chat_id = messages.chat_id AND chat_users.read_up_to >= messages.send_at
+    ''')
+
+    op.drop_column('chat_users', 'read_up_to')
@@ -0,0 +1,35 @@
+"""Unread counters
+
+Revision ID: 2573945955fd
+Revises: a87743f033e9
+Create Date: 2026-10-17 13:30:41.508713
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2573945955fd'
+down_revision: Union[str, None] = 'a87743f033e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_users', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('''
+        UPDATE chat_users
+        SET unread_count = (SELECT count(*)
+                            FROM messages
+                            WHERE messages.chat_id = chat_users.chat_id
+                              AND messages.sender_id != chat_users.user_id
+                              AND (chat_users.read_up_to IS NULL OR messages.send_at > chat_users.read_up_to))
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_column('chat_users', 'unread_count')
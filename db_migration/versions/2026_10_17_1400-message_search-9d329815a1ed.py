@@ -0,0 +1,34 @@
+"""Message search
+
+Revision ID: 9d329815a1ed
+Revises: 2573945955fd
+Create Date: 2026-10-17 14:00:27.940312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d329815a1ed'
+down_revision: Union[str, None] = '2573945955fd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Adding a stored generated column rewrites the table, plan a maintenance window for big ones
+    op.add_column('messages', sa.Column('search_vector',
+                                        postgresql.TSVECTOR(),
+                                        sa.Computed("to_tsvector('simple', text)", persisted=True),
+                                        nullable=True))
+    op.create_index('ix_messages_search_vector', 'messages', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_using='gin')
+    op.drop_column('messages', 'search_vector')
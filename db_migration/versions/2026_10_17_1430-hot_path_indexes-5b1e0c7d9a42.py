@@ -0,0 +1,35 @@
+"""Hot path indexes
+
+Revision ID: 5b1e0c7d9a42
+Revises: 9d329815a1ed
+Create Date: 2026-10-17 14:30:08.215436
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0c7d9a42'
+down_revision: Union[str, None] = '9d329815a1ed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable during the build but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_chat_id_send_at', 'messages', ['chat_id', 'send_at', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_messages_sender_id'), 'messages', ['sender_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_chat_users_user_id'), 'chat_users', ['user_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_chat_users_user_id'), table_name='chat_users', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_messages_sender_id'), table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_messages_chat_id_send_at', table_name='messages', postgresql_concurrently=True)
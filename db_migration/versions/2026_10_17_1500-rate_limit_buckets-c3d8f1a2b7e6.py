@@ -0,0 +1,32 @@
+"""Rate limit buckets
+
+Revision ID: c3d8f1a2b7e6
+Revises: 5b1e0c7d9a42
+Create Date: 2026-10-17 15:00:41.730912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8f1a2b7e6'
+down_revision: Union[str, None] = '5b1e0c7d9a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=320), nullable=False),
+    sa.Column('tokens', sa.Double(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED']
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_limit_buckets')
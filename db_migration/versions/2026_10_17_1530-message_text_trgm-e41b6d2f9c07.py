@@ -0,0 +1,31 @@
+"""Message text trigram index
+
+Revision ID: e41b6d2f9c07
+Revises: c3d8f1a2b7e6
+Create Date: 2026-10-17 15:30:12.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b6d2f9c07'
+down_revision: Union[str, None] = 'c3d8f1a2b7e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY keeps the table writable during the build but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_text_trgm', 'messages', ['text'], unique=False, postgresql_using='gin',
+                        postgresql_ops={'text': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_text_trgm', table_name='messages', postgresql_using='gin',
+                      postgresql_concurrently=True)
@@ -1,7 +1,39 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import pytest
 import pytest_asyncio
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.websockets import WebSocketDisconnect
 
+from app.db.postgres import create_read_only_engine, read_only_engine as app_read_only_engine, read_only_session_maker
 from app.models.base import Base
+from app.services.auth_cache import auth_cache
+from app.services.chat_member_cache import chat_member_cache
+from app.services.message_batcher import message_batcher as app_message_batcher
+from app.services.message_dispatcher import message_dispatcher as app_message_dispatcher
+from app.services.rate_limiter import login_rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def clear_chat_member_cache():
+    # Every test starts with an empty database, so chat ids repeat across tests
+    chat_member_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_cache():
+    # User ids repeat across tests as well
+    auth_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_login_rate_limiter():
+    # Tests log in as the same usernames, so their attempts must not add up
+    login_rate_limiter.backend.clear()
 
 
 @pytest_asyncio.fixture
@@ -15,6 +47,44 @@ async def engine(postgresql):
     yield engine
 
 
+@pytest.fixture
+def capture_statements(engine):
+    """
+    `with capture_statements() as statements:` collects the SQL sent to the database inside the block,
+    as `(statement, parameters)` pairs with `with_parameters=True`.
+    """
+    @contextmanager
+    def capture(with_parameters: bool = False) -> Iterator[list[str] | list[tuple[str, tuple]]]:
+        statements: list[str] | list[tuple[str, tuple]] = []
+
+        def add_statement(_, __, statement: str, parameters: tuple, *___) -> None:
+            statements.append((statement, parameters) if with_parameters else statement)
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', add_statement)
+        try:
+            yield statements
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', add_statement)
+
+    return capture
+
+
+@pytest.fixture
+def wait_for():
+    """`await wait_for(condition)` polls the condition until it is true, failing after `timeout` seconds."""
+    async def wait(condition: Callable[[], bool], timeout: float = 5) -> None:
+        async with asyncio.timeout(timeout):
+            while not condition():
+                await asyncio.sleep(0.01)
+
+    return wait
+
+
+@pytest_asyncio.fixture
+async def session_maker(engine):
+    return async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
 @pytest_asyncio.fixture
 async def db(engine):
     session_maker = async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
@@ -28,6 +98,17 @@ async def db(engine):
         await session.close()
 
 
+@pytest_asyncio.fixture
+async def read_only_engine(postgresql, engine):
+    connection = f'postgresql+asyncpg://{postgresql.info.user}:@{postgresql.info.host}:{postgresql.info.port}/{postgresql.info.dbname}'
+    read_only_engine = create_read_only_engine(database_url=connection)
+    # get_db_read_only yields sessions of the app session maker, bound to the test database meanwhile
+    read_only_session_maker.configure(bind=read_only_engine)
+    yield read_only_engine
+    read_only_session_maker.configure(bind=app_read_only_engine)
+    await read_only_engine.dispose()
+
+
 @pytest_asyncio.fixture
 async def db_transaction(engine):
     session_maker = async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
@@ -37,3 +118,52 @@ async def db_transaction(engine):
     finally:
         await session.commit()
         await session.close()
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.accepted: bool = False
+        self.closed_code: int | None = None
+        self.sent: list[dict] = []
+        self.inbound: asyncio.Queue = asyncio.Queue()
+
+    async def accept(self) -> None:
+        self.accepted = True
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_code = code
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(json.loads(data))
+
+    async def receive_json(self) -> dict:
+        data: dict | list | Exception | None = await self.inbound.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+
+@pytest_asyncio.fixture
+async def message_dispatcher():
+    await app_message_dispatcher.start()
+    yield app_message_dispatcher
+    await app_message_dispatcher.stop()
+
+
+@pytest.fixture
+def websocket_factory():
+    return FakeWebsocket
+
+
+@pytest.fixture
+def database_dsn(postgresql) -> str:
+    return f'postgresql://{postgresql.info.user}:@{postgresql.info.host}:{postgresql.info.port}/{postgresql.info.dbname}'
+
+
+@pytest_asyncio.fixture
+async def message_batcher(session_maker, message_dispatcher):
+    await app_message_batcher.start(session_maker=session_maker)
+    yield app_message_batcher
+    await app_message_batcher.stop()
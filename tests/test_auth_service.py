@@ -1,17 +1,27 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
 
 import pytest
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.configs.logging_settings import LogLevelType
 from app.configs.settings import jwt_settings
+from app.exceptions.too_many_requests_429 import TooManyLoginAttemptsException
 from app.exceptions.unauthorized_401 import InvalidLoginDataException, InvalidTokenException
+from app.models.user import User as UserModel
 from app.schemas.error_response import ErrorCodeType
-from app.schemas.jwt import Tokens, TokenType
+from app.schemas.jwt import TokenData, Tokens, TokenType
+from app.schemas.rate_limit import LoginRateLimiterStats
 from app.schemas.user import User, UserCreateRequest
 from app.services import auth_service, user_service
+from app.services.auth_cache import auth_cache, USERS_CHANNEL
+from app.services.message_bus import message_bus
+from app.services.password_hasher import password_hasher
+from app.services.rate_limiter import login_rate_limiter, PostgresRateLimiterBackend
 
 
 @pytest.mark.asyncio
@@ -39,6 +49,37 @@ async def test_login_ok(db: AsyncSession):
     assert tokens.refresh_token_expired_at > now + timedelta(seconds=jwt_settings.refresh_token_expire_seconds - 2)
 
 
+@pytest.mark.asyncio
+async def test_login_does_not_block_event_loop(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username=create_data.username,
+                                                                     password=create_data.password)
+    completed_before: int = password_hasher.get_stats().completed
+    ticks: list[float] = []
+
+    async def tick() -> None:
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    tick_task: asyncio.Task = asyncio.create_task(tick())
+
+    # Act
+    try:
+        tokens: list[Tokens] = [await auth_service.login(db=db, form_data=form_data) for _ in range(3)]
+    finally:
+        tick_task.cancel()
+
+    # Assert
+    assert len(tokens) == 3
+    assert password_hasher.get_stats().completed == completed_before + 3
+    assert max(later - earlier for earlier, later in zip(ticks, ticks[1:])) < 0.1
+
+
 @pytest.mark.asyncio
 async def test_login_user_not_found(db: AsyncSession):
     # Arrange
@@ -78,6 +119,92 @@ async def test_login_wrong_password(db: AsyncSession):
     assert exc.value.error_code == ErrorCodeType.INVALID_LOGIN_DATA
 
 
+@pytest.mark.asyncio
+async def test_login_throttled_by_username(db: AsyncSession):
+    # Arrange
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username='user', password='password')
+    stats_before: LoginRateLimiterStats = login_rate_limiter.get_stats()
+    for _ in range(login_rate_limiter.username_burst):
+        with pytest.raises(InvalidLoginDataException):
+            await auth_service.login(db=db, form_data=form_data, address='10.0.0.1')
+
+    # Act
+    with pytest.raises(TooManyLoginAttemptsException) as exc:
+        await auth_service.login(db=db, form_data=form_data, address='10.0.0.2')
+
+    # Assert
+    assert exc.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert exc.value.message == 'Too many login attempts'
+    assert exc.value.log_message == 'Login attempts limit reached for `username:user`'
+    assert exc.value.log_level == LogLevelType.WARNING
+    assert exc.value.error_code == ErrorCodeType.TOO_MANY_LOGIN_ATTEMPTS
+    stats: LoginRateLimiterStats = login_rate_limiter.get_stats()
+    assert stats.allowed == stats_before.allowed + login_rate_limiter.username_burst
+    assert stats.rejected_by_username == stats_before.rejected_by_username + 1
+
+
+@pytest.mark.asyncio
+async def test_login_username_too_long(db: AsyncSession):
+    # Arrange
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username='u' * 1000, password='password')
+    stats_before: LoginRateLimiterStats = login_rate_limiter.get_stats()
+
+    # Act
+    with pytest.raises(InvalidLoginDataException) as exc:
+        await auth_service.login(db=db, form_data=form_data, address='10.0.0.1')
+
+    # Assert
+    assert exc.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert exc.value.log_message == f'User with username `{"u" * 256}...` does not exist'
+    assert login_rate_limiter.get_stats() == stats_before
+
+
+@pytest.mark.asyncio
+async def test_login_throttled_by_address(db: AsyncSession):
+    # Arrange
+    stats_before: LoginRateLimiterStats = login_rate_limiter.get_stats()
+    for i in range(login_rate_limiter.address_burst):
+        form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username=f'user{i}', password='password')
+        with pytest.raises(InvalidLoginDataException):
+            await auth_service.login(db=db, form_data=form_data, address='10.0.0.1')
+
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username='user', password='password')
+
+    # Act
+    with pytest.raises(TooManyLoginAttemptsException) as exc:
+        await auth_service.login(db=db, form_data=form_data, address='10.0.0.1')
+
+    # Assert
+    assert exc.value.log_message == 'Login attempts limit reached for `address:10.0.0.1`'
+    assert login_rate_limiter.get_stats().rejected_by_address == stats_before.rejected_by_address + 1
+    with pytest.raises(InvalidLoginDataException):
+        await auth_service.login(db=db, form_data=form_data, address='10.0.0.2')
+
+
+@pytest.mark.asyncio
+async def test_postgres_rate_limiter_backend(engine, database_dsn: str):
+    # Arrange
+    backend: PostgresRateLimiterBackend = PostgresRateLimiterBackend(dsn=database_dsn, bucket_ttl=3600)
+    other_worker_backend: PostgresRateLimiterBackend = PostgresRateLimiterBackend(dsn=database_dsn, bucket_ttl=3600)
+    await backend.start()
+    await other_worker_backend.start()
+
+    # Act
+    try:
+        taken: list[bool] = [await backend.take(key='username:user', rate=0.001, burst=2),
+                             await other_worker_backend.take(key='username:user', rate=0.001, burst=2),
+                             await backend.take(key='username:user', rate=0.001, burst=2),
+                             await other_worker_backend.take(key='username:other', rate=0.001, burst=2)]
+        refilled: bool = await backend.take(key='username:user', rate=1000, burst=2)
+    finally:
+        await backend.stop()
+        await other_worker_backend.stop()
+
+    # Assert
+    assert taken == [True, True, False, True]
+    assert refilled is True
+
+
 @pytest.mark.asyncio
 async def test_refresh_token_ok(db: AsyncSession):
     # Arrange
@@ -143,3 +270,73 @@ async def test_refresh_token_no_user(db: AsyncSession):
     assert exc.value.log_message == f'User with id `{user_id}` not found'
     assert exc.value.log_level == LogLevelType.WARNING
     assert exc.value.error_code == ErrorCodeType.INVALID_TOKEN
+
+
+@pytest.mark.asyncio
+async def test_authenticate_cached(db: AsyncSession, capture_statements):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username=create_data.username,
+                                                                     password=create_data.password)
+    tokens: Tokens = await auth_service.login(db=db, form_data=form_data)
+    await auth_service.authenticate(db=db, token=tokens.access_token)
+
+    # Act
+    with capture_statements() as statements:
+        token_data: TokenData = await auth_service.authenticate(db=db, token=tokens.access_token)
+
+    # Assert
+    assert token_data.user_id == user.id
+    assert token_data.type == TokenType.ACCESS
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_invalidated(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username=create_data.username,
+                                                                     password=create_data.password)
+    tokens: Tokens = await auth_service.login(db=db, form_data=form_data)
+    await auth_service.authenticate(db=db, token=tokens.access_token)
+
+    await db.execute(delete(UserModel).where(UserModel.id == user.id))
+    await db.commit()
+
+    # Act
+    await auth_cache.invalidate_user(user_id=user.id)
+    with pytest.raises(InvalidTokenException) as exc:
+        await auth_service.authenticate(db=db, token=tokens.access_token)
+
+    # Assert
+    assert exc.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert exc.value.log_message == f'User with id `{user.id}` not found'
+    assert exc.value.error_code == ErrorCodeType.INVALID_TOKEN
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_invalidated_by_other_worker(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    form_data: OAuth2PasswordRequestForm = OAuth2PasswordRequestForm(username=create_data.username,
+                                                                     password=create_data.password)
+    tokens: Tokens = await auth_service.login(db=db, form_data=form_data)
+    await auth_service.authenticate(db=db, token=tokens.access_token)
+    cached_before: bool = auth_cache.user_exists(user_id=user.id)
+
+    # Act
+    await message_bus.publish(channel=USERS_CHANNEL, payload=str(user.id))
+
+    # Assert
+    assert cached_before is True
+    assert auth_cache.user_exists(user_id=user.id) is False
+    assert auth_cache.get_token(token=tokens.access_token) is not None
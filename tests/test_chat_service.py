@@ -1,16 +1,32 @@
+import asyncio
+from json import JSONDecodeError
+from uuid import uuid4
+
+import bcrypt
 import pytest
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine, AsyncSession
 from starlette import status
 
 from app.configs.logging_settings import LogLevelType
+from app.configs.settings import websocket_settings
+from app.crud.user import user_crud
 from app.exceptions.conflict_409 import IntegrityException
+from app.exceptions.forbidden_403 import UserNotChatMemberException
 from app.exceptions.not_fount_404 import EntityNotFound
 from app.models.chat import Chat as ChatModel, ChatUser as ChatUserModel
-from app.schemas.chat import Chat, ChatCreate, ChatType
+from app.models.message import Message as MessageModel
+from app.models.user import User as UserModel
+from app.schemas.chat import Chat, ChatCreate, ChatType, ChatUnread
 from app.schemas.error_response import ErrorCodeType
-from app.schemas.user import User, UserCreateRequest
-from app.services import chat_service, user_service
+from app.schemas.group import Group, GroupCreateRequest, GroupUsersCreateRequest
+from app.schemas.message import MessageCreateRequest
+from app.schemas.user import User, UserCreate, UserCreateRequest
+from app.services import chat_service, group_service, message_service, user_service
+from app.services.chat_member_cache import CHAT_MEMBERS_CHANNEL, chat_member_cache
+from app.services.message_bus import message_bus
+from app.services.message_dispatcher import MessageDispatcher
+from app.services.websocket_manager import websocket_manager
 
 
 @pytest.mark.asyncio
@@ -62,6 +78,33 @@ async def test_create_chat_double(db: AsyncSession, db_transaction: AsyncSession
     assert len(chats_db) == 1
 
 
+@pytest.mark.asyncio
+async def test_create_chat_users_is_one_insert(db: AsyncSession, capture_statements):
+    # Arrange
+    create_data: ChatCreate = ChatCreate(name='test', type=ChatType.GROUP)
+    chat: Chat = await chat_service.create_chat(db=db, create_data=create_data)
+
+    hashed_password: str = bcrypt.hashpw('password'.encode(), bcrypt.gensalt(rounds=4)).decode()
+    users_create: list[UserCreate] = [UserCreate(username=f'user{i}', password=hashed_password) for i in range(1000)]
+    users_db: list[UserModel] = await user_crud.create_batch(db=db, objs_in=users_create)
+    await db.commit()
+
+    # Act
+    with capture_statements() as statements:
+        await chat_service.create_chat_users(db=db, chat_id=chat.id, user_ids=[user_db.id for user_db in users_db])
+    await db.commit()
+
+    # Assert
+    assert [user_db.username for user_db in users_db] == [user_create.username for user_create in users_create]
+    assert all(user_db.created_at is not None for user_db in users_db)
+
+    assert len(statements) == 1
+    assert statements[0].startswith('INSERT INTO chat_users')
+
+    chat_users_db: list[ChatUserModel] = (await db.scalars(select(ChatUserModel))).all()
+    assert len(chat_users_db) == 1000
+
+
 @pytest.mark.asyncio
 async def test_create_chat_users_double(db: AsyncSession, db_transaction: AsyncSession):
     # Arrange
@@ -130,3 +173,363 @@ async def test_get_chat_not_found(db: AsyncSession):
     assert exc.value.log_message == f'{ChatModel.__name__} not found by {search_params}'
     assert exc.value.log_level == LogLevelType.ERROR
     assert exc.value.error_code == ErrorCodeType.ENTITY_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_chat_cached(db: AsyncSession, capture_statements):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat_before: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+    await chat_service.get_chat(db=db, chat_id=chat_before.id, current_user_id=user1.id)
+
+    # Act
+    with capture_statements() as statements:
+        chat: Chat = await chat_service.get_chat(db=db, chat_id=chat_before.id, current_user_id=user2.id)
+        with pytest.raises(UserNotChatMemberException):
+            await chat_service.get_chat(db=db, chat_id=chat_before.id, current_user_id=user2.id + 1)
+
+    # Assert
+    assert chat == chat_before
+    assert len(statements) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_chat_cache_invalidated_on_new_members(db: AsyncSession, db_transaction: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='group')
+    group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user1.id)
+    await db.commit()
+    await chat_service.get_chat(db=db, chat_id=group.chat_id, current_user_id=user1.id)
+
+    # Act
+    group_users_request: GroupUsersCreateRequest = GroupUsersCreateRequest(group_id=group.id, user_ids=[user2.id])
+    await group_service.add_users_to_group(db=db_transaction,
+                                           group_users_request=group_users_request,
+                                           current_user_id=user1.id)
+    await db_transaction.commit()
+
+    # Assert
+    chat: Chat = await chat_service.get_chat(db=db, chat_id=group.chat_id, current_user_id=user2.id)
+    assert chat.id == group.chat_id
+
+
+@pytest.mark.asyncio
+async def test_chat_member_cache_invalidated_by_other_worker(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+    await chat_service.get_chat(db=db, chat_id=chat.id, current_user_id=user1.id)
+    cached_before: tuple[Chat, frozenset[int]] | None = chat_member_cache.get(chat_id=chat.id)
+    stale_version: int = chat_member_cache.version
+
+    # Act
+    await message_bus.publish(channel=CHAT_MEMBERS_CHANNEL, payload=f'other_worker:{chat.id}')
+    chat_member_cache.add(chat=chat, chat_user_ids=[user1.id], version=stale_version)
+
+    # Assert
+    assert cached_before == (chat, frozenset({user1.id, user2.id}))
+    assert chat_member_cache.get(chat_id=chat.id) is None
+
+
+@pytest.mark.asyncio
+async def test_get_unread_chats(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user3', password='password')
+    user3: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    other_chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user3.id)
+
+    message_ids: list = []
+    for sender_id in (user2.id, user2.id, user1.id, user2.id):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=sender_id, device_id='1')
+        await db.commit()
+        message_ids.append(create_data.id)
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=other_chat.id, text='text')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user3.id, device_id='3')
+    await db.commit()
+
+    # Act
+    unread_before: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=user1.id)
+    await message_service.read_messages(db=db, message_ids=[message_ids[1]], current_user_id=user1.id)
+    await db.commit()
+    unread_after: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=user1.id)
+    unread_sender: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=user2.id)
+
+    # Assert
+    assert unread_before == [ChatUnread(chat_id=chat.id, unread_count=3),
+                             ChatUnread(chat_id=other_chat.id, unread_count=1)]
+    assert unread_after == [ChatUnread(chat_id=chat.id, unread_count=1),
+                            ChatUnread(chat_id=other_chat.id, unread_count=1)]
+    assert unread_sender == [ChatUnread(chat_id=chat.id, unread_count=1)]
+
+
+@pytest.mark.asyncio
+async def test_connect_subscribe_and_receive(db: AsyncSession, session_maker: async_sessionmaker, websocket_factory,
+                                             message_dispatcher: MessageDispatcher, wait_for):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user3', password='password')
+    user3: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    other_chat: Chat = await chat_service.create_private_chat(db=db, user_id=user2.id, current_user_id=user3.id)
+    await db.commit()
+
+    websocket = websocket_factory()
+    connect_task: asyncio.Task = asyncio.create_task(chat_service.connect(session_maker=session_maker,
+                                                                          websocket=websocket,
+                                                                          current_user_id=user1.id,
+                                                                          device_id='1'))
+
+    # Act
+    await websocket.inbound.put({'type': 'subscribe', 'chat_ids': [chat.id, other_chat.id]})
+    await wait_for(lambda: len(websocket.sent) == 1)
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='2')
+    await db.commit()
+    await wait_for(lambda: len(websocket.sent) == 2)
+
+    await websocket.inbound.put(None)
+    await connect_task
+
+    # Assert
+    assert websocket.accepted is True
+    assert websocket.sent[0] == {'type': 'subscribed', 'chat_ids': [chat.id]}
+    assert websocket.sent[1]['id'] == str(create_data.id)
+    assert websocket_manager.get_user_connections(user_id=user1.id) == []
+
+
+@pytest.mark.asyncio
+async def test_connect_skips_malformed_frames(db: AsyncSession, session_maker: async_sessionmaker, websocket_factory,
+                                              wait_for):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    websocket = websocket_factory()
+    connect_task: asyncio.Task = asyncio.create_task(chat_service.connect(session_maker=session_maker,
+                                                                          websocket=websocket,
+                                                                          current_user_id=user1.id,
+                                                                          device_id='1'))
+
+    # Act
+    await websocket.inbound.put(JSONDecodeError('Expecting value', 'not json', 0))
+    await websocket.inbound.put([chat.id])
+    await websocket.inbound.put(chat.id)
+    await websocket.inbound.put({'type': 'subscribe', 'chat_ids': [chat.id]})
+    await wait_for(lambda: len(websocket.sent) == 1)
+
+    # A frame the loop does not expect ends the connection
+    await websocket.inbound.put(KeyError('text'))
+    with pytest.raises(KeyError):
+        await connect_task
+
+    # Assert
+    assert websocket.sent[0]['type'] == 'subscribed'
+    assert websocket_manager.get_user_connections(user_id=user1.id) == []
+    assert websocket_manager.registry.get((user1.id, '1', None)) is None
+
+
+@pytest.mark.asyncio
+async def test_connect_to_chat_reads_frames_in_batches(db: AsyncSession, session_maker: async_sessionmaker,
+                                                       websocket_factory):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    message_ids: list = []
+    for _ in range(20):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='2')
+        message_ids.append(create_data.id)
+    await db.commit()
+
+    websocket = websocket_factory()
+    for message_id in message_ids:
+        websocket.inbound.put_nowait({'message_id': str(message_id)})
+
+    # Act
+    connect_task: asyncio.Task = asyncio.create_task(chat_service.connect_to_chat(session_maker=session_maker,
+                                                                                  websocket=websocket,
+                                                                                  chat_id=chat.id,
+                                                                                  current_user_id=user1.id,
+                                                                                  device_id='1'))
+
+    async def all_read() -> bool:
+        db.expire_all()
+        messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+        return all(message_db.read_at is not None for message_db in messages_db)
+
+    async with asyncio.timeout(1):
+        while not await all_read():
+            await asyncio.sleep(0.01)
+
+    await websocket.inbound.put(None)
+    await connect_task
+
+    # Assert
+    assert websocket.accepted is True
+
+
+@pytest.mark.asyncio
+async def test_idle_websockets_hold_no_db_connections(db: AsyncSession, engine: AsyncEngine,
+                                                      session_maker: async_sessionmaker, websocket_factory, wait_for):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='2')
+    await db.commit()
+    await db.close()
+
+    websockets: list = [websocket_factory() for _ in range(1000)]
+
+    # Act
+    connect_tasks: list[asyncio.Task] = [
+        asyncio.create_task(chat_service.connect_to_chat(session_maker=session_maker,
+                                                         websocket=websocket,
+                                                         chat_id=chat.id,
+                                                         current_user_id=user1.id,
+                                                         device_id=str(device_id)))
+        for device_id, websocket in enumerate(websockets)
+    ]
+    await wait_for(lambda: all(websocket.accepted for websocket in websockets), timeout=30)
+    idle_checked_out: int = engine.pool.checkedout()
+
+    await websockets[0].inbound.put({'message_id': str(create_data.id)})
+    async with asyncio.timeout(5):
+        while True:
+            async with session_maker() as session:
+                if (await session.get(MessageModel, create_data.id)).read_at is not None:
+                    break
+            await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+    read_checked_out: int = engine.pool.checkedout()
+
+    for websocket in websockets:
+        await websocket.inbound.put(None)
+    await asyncio.gather(*connect_tasks)
+
+    # Assert
+    assert idle_checked_out == 0
+    assert read_checked_out == 0
+
+
+@pytest.mark.asyncio
+async def test_connect_to_chat_replays_missed_messages(db: AsyncSession, session_maker: async_sessionmaker,
+                                                       websocket_factory, message_dispatcher: MessageDispatcher,
+                                                       wait_for):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    message_ids: list = []
+    for _ in range(3):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='2')
+        await db.commit()
+        message_ids.append(str(create_data.id))
+    await message_dispatcher.flush()
+
+    stats = websocket_manager.get_stats()
+    websocket = websocket_factory()
+    connect_task: asyncio.Task = asyncio.create_task(chat_service.connect_to_chat(session_maker=session_maker,
+                                                                                  websocket=websocket,
+                                                                                  chat_id=chat.id,
+                                                                                  current_user_id=user1.id,
+                                                                                  device_id='1'))
+
+    # Act
+    await websocket.inbound.put({'type': 'replay', 'message_id': message_ids[0]})
+    await wait_for(lambda: len(websocket.sent) == 3)
+
+    websocket_manager.replay_buffer.chats.pop(chat.id)
+    await websocket.inbound.put({'type': 'replay', 'message_id': message_ids[0]})
+    await wait_for(lambda: len(websocket.sent) == 6)
+
+    await websocket.inbound.put(None)
+    await connect_task
+
+    # Assert
+    assert [frame['id'] for frame in websocket.sent[:2]] == message_ids[1:]
+    assert websocket.sent[2] == {'type': 'replayed', 'chat_id': chat.id, 'has_more': False}
+    assert websocket.sent[3:] == websocket.sent[:3]
+    assert websocket_manager.get_stats().replay_hits == stats.replay_hits + 1
+    assert websocket_manager.get_stats().replay_misses == stats.replay_misses + 1
+
+
+@pytest.mark.asyncio
+async def test_connect_to_chat_replay_has_more(db: AsyncSession, session_maker: async_sessionmaker,
+                                               websocket_factory, wait_for, monkeypatch):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    message_ids: list = []
+    for _ in range(4):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='2')
+        await db.commit()
+        message_ids.append(str(create_data.id))
+
+    monkeypatch.setattr(websocket_settings, 'replay_buffer_size', 2)
+    websocket = websocket_factory()
+    connect_task: asyncio.Task = asyncio.create_task(chat_service.connect_to_chat(session_maker=session_maker,
+                                                                                  websocket=websocket,
+                                                                                  chat_id=chat.id,
+                                                                                  current_user_id=user1.id,
+                                                                                  device_id='1'))
+
+    # Act
+    await websocket.inbound.put({'type': 'replay', 'message_id': message_ids[0]})
+    await wait_for(lambda: len(websocket.sent) == 3)
+
+    await websocket.inbound.put(None)
+    await connect_task
+
+    # Assert
+    assert [frame['id'] for frame in websocket.sent[:2]] == message_ids[1:3]
+    assert websocket.sent[2] == {'type': 'replayed', 'chat_id': chat.id, 'has_more': True}
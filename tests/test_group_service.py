@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 import pytest
 from fastapi_pagination import Page
 from sqlalchemy import select
@@ -10,10 +12,12 @@ from app.exceptions.forbidden_403 import UserNotGroupOwner
 from app.exceptions.not_fount_404 import EntityNotFound
 from app.models.chat import Chat as ChatModel, ChatUser as ChatUserModel
 from app.models.group import Group as GroupModel
+from app.schemas.chat import ChatUnread
 from app.schemas.error_response import ErrorCodeType
 from app.schemas.group import Group, GroupCreateRequest, GroupMembersRequest, GroupRequest, GroupUsersCreateRequest
+from app.schemas.message import MessageCreateRequest
 from app.schemas.user import User, UserCreateRequest
-from app.services import group_service, user_service
+from app.services import chat_service, group_service, message_service, user_service
 
 
 @pytest.mark.asyncio
@@ -49,6 +53,29 @@ async def test_create_group_ok(db: AsyncSession, db_transaction: AsyncSession):
     assert chat_users_db[0].user_id == user.id
 
 
+@pytest.mark.asyncio
+async def test_create_group_is_one_statement_per_row(db: AsyncSession, capture_statements):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='group')
+    # Act
+    with capture_statements() as statements:
+        group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user.id)
+    await db.commit()
+
+    # Assert
+    assert [statement.split()[2] for statement in statements] == ['chats', 'groups', 'chat_users']
+    assert all(statement.startswith('INSERT') for statement in statements)
+
+    # Server defaults came back with the insert, no refresh needed
+    group_db: GroupModel = await db.get(GroupModel, group.id)
+    assert group_db.created_at is not None
+    assert group_db.updated_at is not None
+
+
 @pytest.mark.asyncio
 async def test_create_group_double(db: AsyncSession, db_transaction: AsyncSession):
     # Arrange
@@ -110,6 +137,44 @@ async def test_add_users_to_group(db: AsyncSession, db_transaction: AsyncSession
         assert chat_user.user_id in user_ids or chat_user.user_id == user.id
 
 
+@pytest.mark.asyncio
+async def test_add_users_to_group_history_is_read(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='member', password='password')
+    member: User = await user_service.create_user(db=db, create_data=create_data)
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='test')
+    group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user.id)
+    await db.commit()
+
+    history_ids: list = []
+    for _ in range(3):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=group.chat_id, text='text')
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user.id, device_id='1')
+        await db.commit()
+        history_ids.append(create_data.id)
+
+    group_users_request: GroupUsersCreateRequest = GroupUsersCreateRequest(group_id=group.id, user_ids=[member.id])
+
+    # Act
+    await group_service.add_users_to_group(db=db, group_users_request=group_users_request, current_user_id=user.id)
+    await db.commit()
+    unread_after_join: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=member.id)
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=group.chat_id, text='text')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user.id, device_id='1')
+    await db.commit()
+    await message_service.read_messages(db=db, message_ids=[history_ids[0]], current_user_id=member.id)
+    await db.commit()
+    unread_after_read: list[ChatUnread] = await chat_service.get_unread_chats(db=db, current_user_id=member.id)
+
+    # Assert
+    assert unread_after_join == [ChatUnread(chat_id=group.chat_id, unread_count=0)]
+    assert unread_after_read == [ChatUnread(chat_id=group.chat_id, unread_count=1)]
+
+
 @pytest.mark.asyncio
 async def test_add_users_to_group_no_group(db: AsyncSession):
     # Arrange
@@ -1,32 +1,44 @@
+import asyncio
+from datetime import datetime
 from unittest.mock import AsyncMock, patch
 from uuid import UUID, uuid4
 
 import pytest
 from fastapi_pagination import Page
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from starlette import status
 
 from app.configs.logging_settings import LogLevelType
+from app.exceptions.bad_request_400 import InvalidCursorException
+from app.exceptions.conflict_409 import MessageIdTakenException
 from app.exceptions.forbidden_403 import UserNotChatMemberException
 from app.exceptions.not_fount_404 import EntityNotFound
-from app.models.message import Message as MessageModel, MessageUserRead
+from app.crud.message import message_crud
+from app.models.chat import ChatUser as ChatUserModel
+from app.models.message import Message as MessageModel
 from app.schemas.chat import Chat
 from app.schemas.error_response import ErrorCodeType
 from app.schemas.group import Group, GroupCreateRequest, GroupUsersCreateRequest
-from app.schemas.message import Message, MessageCreateRequest, MessageRequest
+from app.schemas.message import (HistoryDirection, HistoryMode, Message, MessageCreate, MessageCreateRequest,
+                                 MessageCursorPage, MessageRequest, MessageSearchRequest)
 from app.schemas.user import User, UserCreateRequest
 from app.services import chat_service, group_service, message_service, user_service
+from app.services.message_batcher import MessageBatcher
+from app.services.message_dispatcher import MessageDispatcher
+from app.services.sent_message_cache import sent_message_cache
 
 
 @pytest.fixture
 def mock_send_message():
-    with patch('app.services.message_service.websocket_manager.send_message', autospec=True) as mock_send:
+    with patch('app.services.message_dispatcher.websocket_manager.send_message', autospec=True) as mock_send:
         yield mock_send
 
 
 @pytest.mark.asyncio
-async def test_send_message_ok(db: AsyncSession, db_transaction: AsyncSession, mock_send_message: AsyncMock):
+async def test_send_message_ok(db: AsyncSession, db_transaction: AsyncSession, mock_send_message: AsyncMock,
+                               message_dispatcher: MessageDispatcher):
     # Arrange
     create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
     user1: User = await user_service.create_user(db=db, create_data=create_data)
@@ -42,6 +54,7 @@ async def test_send_message_ok(db: AsyncSession, db_transaction: AsyncSession, m
     message: Message = await message_service.send_message(db=db_transaction, create_data=create_data,
                                                           current_user_id=user1.id, device_id='1')
     await db_transaction.commit()
+    await message_dispatcher.flush()
 
     # Assert
     assert message is not None
@@ -58,8 +71,38 @@ async def test_send_message_ok(db: AsyncSession, db_transaction: AsyncSession, m
     messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
     assert len(messages_db) == 1
 
-    message_users_read: list[MessageUserRead] = (await db.scalars(select(MessageUserRead))).all()
-    assert len(message_users_read) == 1
+
+@pytest.mark.asyncio
+async def test_send_message_dispatched_after_commit(db: AsyncSession, mock_send_message: AsyncMock,
+                                                    message_dispatcher: MessageDispatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    # Act
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='rolled back')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user1.id, device_id='1')
+    await db.rollback()
+    await message_dispatcher.flush()
+    calls_after_rollback: int = mock_send_message.call_count
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='committed')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user1.id, device_id='1')
+    await message_dispatcher.flush()
+    calls_before_commit: int = mock_send_message.call_count
+    await db.commit()
+    await message_dispatcher.flush()
+
+    # Assert
+    assert calls_after_rollback == 0
+    assert calls_before_commit == 0
+    assert mock_send_message.call_count == 1
+    assert mock_send_message.call_args.kwargs['message'].id == create_data.id
 
 
 @pytest.mark.asyncio
@@ -90,6 +133,264 @@ async def test_send_message_not_chat_member(db: AsyncSession, db_transaction: As
     assert exc.value.error_code == ErrorCodeType.USER_NOT_CHAT_MEMBER
 
 
+@pytest.mark.asyncio
+async def test_send_message_is_one_statement(db: AsyncSession, capture_statements, mock_send_message: AsyncMock,
+                                             message_dispatcher: MessageDispatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    # Act
+    with capture_statements() as statements:
+        message: Message = await message_service.send_message(db=db, create_data=create_data,
+                                                              current_user_id=user1.id, device_id='1')
+    await db.commit()
+    await message_dispatcher.flush()
+
+    # Assert
+    assert len(statements) == 1
+    assert message.chat == chat
+
+    assert mock_send_message.call_count == 1
+    assert mock_send_message.call_args.kwargs['chat_user_ids'] == {user1.id, user2.id}
+
+    chat_users_db: list[ChatUserModel] = (await db.scalars(select(ChatUserModel))).all()
+    assert {chat_user_db.user_id: chat_user_db.unread_count for chat_user_db in chat_users_db} == {user1.id: 0,
+                                                                                                   user2.id: 1}
+
+
+@pytest.mark.asyncio
+async def test_send_message_chat_not_found(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=100, text='text')
+
+    # Act
+    with pytest.raises(EntityNotFound) as exc:
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user1.id, device_id='1')
+
+    # Assert
+    assert exc.value.status_code == status.HTTP_404_NOT_FOUND
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+    assert len(messages_db) == 0
+
+
+@pytest.mark.asyncio
+async def test_send_message_retry(db: AsyncSession, capture_statements, mock_send_message: AsyncMock,
+                                  message_dispatcher: MessageDispatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    message: Message = await message_service.send_message(db=db, create_data=create_data,
+                                                          current_user_id=user1.id, device_id='1')
+    await db.commit()
+
+    # Act
+    with capture_statements() as statements:
+        message_cached: Message = await message_service.send_message(db=db, create_data=create_data,
+                                                                     current_user_id=user1.id, device_id='1')
+
+    sent_message_cache.clear()
+    message_stored: Message = await message_service.send_message(db=db, create_data=create_data,
+                                                                 current_user_id=user1.id, device_id='1')
+    await db.commit()
+    await message_dispatcher.flush()
+
+    # Assert
+    assert len(statements) == 0
+    assert message_cached == message
+    assert message_stored == message
+
+    assert mock_send_message.call_count == 1
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+    assert len(messages_db) == 1
+
+    chat_users_db: list[ChatUserModel] = (await db.scalars(select(ChatUserModel))).all()
+    assert {chat_user_db.user_id: chat_user_db.unread_count for chat_user_db in chat_users_db} == {user1.id: 0,
+                                                                                                   user2.id: 1}
+
+
+@pytest.mark.asyncio
+async def test_send_message_id_taken(db: AsyncSession, mock_send_message: AsyncMock):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    await message_service.send_message(db=db, create_data=create_data, current_user_id=user1.id, device_id='1')
+    await db.commit()
+
+    # Act
+    with pytest.raises(MessageIdTakenException) as exc:
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=user2.id, device_id='1')
+
+    # Assert
+    assert exc.value.status_code == status.HTTP_409_CONFLICT
+    assert exc.value.message == 'Entity integrity error'
+    assert exc.value.log_message == f'Message id `{create_data.id}` is already taken by another message'
+    assert exc.value.error_code == ErrorCodeType.INTEGRITY_ERROR
+
+
+@pytest.mark.asyncio
+async def test_send_message_batched(db: AsyncSession, capture_statements, session_maker: async_sessionmaker,
+                                    mock_send_message: AsyncMock, message_dispatcher: MessageDispatcher,
+                                    message_batcher: MessageBatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='test')
+    group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user.id)
+
+    user_ids: list[int] = []
+    for i in range(2):
+        create_data: UserCreateRequest = UserCreateRequest(username=f'user{i}', password='password')
+        member_user: User = await user_service.create_user(db=db, create_data=create_data)
+        user_ids.append(member_user.id)
+
+    group_users_request: GroupUsersCreateRequest = GroupUsersCreateRequest(group_id=group.id, user_ids=user_ids)
+    await group_service.add_users_to_group(db=db,
+                                           group_users_request=group_users_request,
+                                           current_user_id=user.id)
+    await db.commit()
+
+    creates_data: list[tuple[MessageCreateRequest, int]] = [
+        (MessageCreateRequest(id=uuid4(), chat_id=group.chat_id, text=f'text{i}'), (user.id, user_ids[0])[i % 2])
+        for i in range(20)
+    ]
+
+    async def send(create_data: MessageCreateRequest, current_user_id: int) -> Message:
+        async with session_maker.begin() as request_db:
+            return await message_service.send_message_batched(db=request_db, create_data=create_data,
+                                                              current_user_id=current_user_id, device_id='1')
+
+    # Act
+    with capture_statements() as statements:
+        messages: list[Message] = await asyncio.gather(*[send(create_data=create_data,
+                                                              current_user_id=current_user_id)
+                                                         for create_data, current_user_id in creates_data])
+    await message_dispatcher.flush()
+
+    # Assert
+    assert [message.id for message in messages] == [create_data.id for create_data, _ in creates_data]
+    assert [message.sender_id for message in messages] == [current_user_id for _, current_user_id in creates_data]
+    assert len(statements) == 1
+    assert 'INSERT INTO messages' in statements[0]
+
+    assert mock_send_message.call_count == 20
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel)
+                                                        .order_by(MessageModel.send_at, MessageModel.id))).all()
+    assert [message_db.id for message_db in messages_db] == [create_data.id for create_data, _ in creates_data]
+    assert len({message_db.send_at for message_db in messages_db}) == 20
+
+    chat_users_db: list[ChatUserModel] = (await db.scalars(select(ChatUserModel))).all()
+    assert {chat_user_db.user_id: chat_user_db.unread_count for chat_user_db in chat_users_db} == {
+        user.id: 10, user_ids[0]: 10, user_ids[1]: 20
+    }
+
+
+@pytest.mark.asyncio
+async def test_send_message_batched_rejected(db: AsyncSession, session_maker: async_sessionmaker,
+                                             mock_send_message: AsyncMock, message_batcher: MessageBatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')
+    creates_data: list[tuple[MessageCreateRequest, int]] = [
+        (create_data, user1.id),
+        (MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='not a member'), 100),
+        (create_data, user2.id),
+    ]
+
+    async def send(create_data: MessageCreateRequest, current_user_id: int) -> Message:
+        async with session_maker.begin() as request_db:
+            return await message_service.send_message_batched(db=request_db, create_data=create_data,
+                                                              current_user_id=current_user_id, device_id='1')
+
+    # Act
+    results: list[Message | Exception] = await asyncio.gather(
+        *[send(create_data=create_data, current_user_id=current_user_id)
+          for create_data, current_user_id in creates_data],
+        return_exceptions=True
+    )
+
+    # Assert
+    assert isinstance(results[0], Message)
+    assert results[0].id == create_data.id
+    assert isinstance(results[1], UserNotChatMemberException)
+    assert isinstance(results[2], MessageIdTakenException)
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+    assert len(messages_db) == 1
+    assert messages_db[0].sender_id == user1.id
+
+
+@pytest.mark.asyncio
+async def test_send_message_batched_failed_batch(db: AsyncSession, session_maker: async_sessionmaker,
+                                                 mock_send_message: AsyncMock, message_batcher: MessageBatcher):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+    await db.commit()
+
+    # Postgres rejects NUL characters in text, so the whole batch statement fails
+    creates_data: list[MessageCreateRequest] = [MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text'),
+                                                MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='bad\x00text'),
+                                                MessageCreateRequest(id=uuid4(), chat_id=chat.id, text='text')]
+
+    async def send(create_data: MessageCreateRequest) -> Message:
+        async with session_maker.begin() as request_db:
+            return await message_service.send_message_batched(db=request_db, create_data=create_data,
+                                                              current_user_id=user1.id, device_id='1')
+
+    # Act
+    results: list[Message | Exception] = await asyncio.gather(*[send(create_data=create_data)
+                                                                for create_data in creates_data],
+                                                              return_exceptions=True)
+
+    # Assert
+    assert isinstance(results[0], Message)
+    assert isinstance(results[1], DBAPIError)
+    assert isinstance(results[2], Message)
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+    assert {message_db.id for message_db in messages_db} == {creates_data[0].id, creates_data[2].id}
+
+
 @pytest.mark.asyncio
 async def test_get_message_ok(db: AsyncSession, mock_send_message: AsyncMock):
     # Arrange
@@ -151,7 +452,8 @@ async def test_get_messages(db: AsyncSession):
         create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text=f'text{i}')
         await message_service.send_message(db=db, create_data=create_data,
                                            current_user_id=user1.id, device_id='1')
-    await db.commit()
+        # Messages of one transaction share send_at
+        await db.commit()
 
     request_p1: MessageRequest = MessageRequest(page=1, size=2)
     request_p2: MessageRequest = MessageRequest(page=2, size=2)
@@ -171,6 +473,104 @@ async def test_get_messages(db: AsyncSession):
     assert messages_p2.items[0].text == 'text2'
 
 
+@pytest.mark.asyncio
+async def test_search_messages(db: AsyncSession):
+    # Arrange
+    user_ids: list[int] = []
+    for i in range(3):
+        create_data: UserCreateRequest = UserCreateRequest(username=f'user{i}', password='password')
+        user: User = await user_service.create_user(db=db, create_data=create_data)
+        user_ids.append(user.id)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user_ids[1], current_user_id=user_ids[0])
+    other_chat: Chat = await chat_service.create_private_chat(db=db, user_id=user_ids[2], current_user_id=user_ids[0])
+    stranger_chat: Chat = await chat_service.create_private_chat(db=db, user_id=user_ids[2],
+                                                                 current_user_id=user_ids[1])
+
+    for chat_id, sender_id, text in [(chat.id, user_ids[0], 'Hello world'),
+                                     (chat.id, user_ids[1], 'goodbye'),
+                                     (other_chat.id, user_ids[2], 'hello there, hello!'),
+                                     (stranger_chat.id, user_ids[1], 'hello stranger')]:
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat_id, text=text)
+        await message_service.send_message(db=db, create_data=create_data, current_user_id=sender_id, device_id='1')
+    await db.commit()
+
+    # Act
+    found: Page[Message] = await message_service.search_messages(db=db,
+                                                                 request=MessageSearchRequest(query='hello'),
+                                                                 current_user_id=user_ids[0])
+    found_in_chat: Page[Message] = await message_service.get_messages(
+        db=db, chat_id=chat.id, request=MessageRequest(search_term='hello')
+    )
+    found_in_chat_by_part: Page[Message] = await message_service.get_messages(
+        db=db, chat_id=chat.id, request=MessageRequest(search_term='ELL')
+    )
+    not_found_by_part: Page[Message] = await message_service.search_messages(db=db,
+                                                                             request=MessageSearchRequest(query='ell'),
+                                                                             current_user_id=user_ids[0])
+    not_found: Page[Message] = await message_service.search_messages(db=db,
+                                                                     request=MessageSearchRequest(query='stranger'),
+                                                                     current_user_id=user_ids[0])
+
+    # Assert
+    assert [message.text for message in found.items] == ['hello there, hello!', 'Hello world']
+    assert found.total == 2
+    assert [message.text for message in found_in_chat.items] == ['Hello world']
+    assert [message.text for message in found_in_chat_by_part.items] == ['Hello world']
+    assert not_found_by_part.items == []
+    assert not_found.items == []
+
+
+@pytest.mark.asyncio
+async def test_get_messages_by_cursor(db: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user1', password='password')
+    user1: User = await user_service.create_user(db=db, create_data=create_data)
+    create_data: UserCreateRequest = UserCreateRequest(username='user2', password='password')
+    user2: User = await user_service.create_user(db=db, create_data=create_data)
+
+    chat: Chat = await chat_service.create_private_chat(db=db, user_id=user1.id, current_user_id=user2.id)
+
+    for i in range(5):
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat.id, text=f'text{i}')
+        await message_service.send_message(db=db, create_data=create_data,
+                                           current_user_id=user1.id, device_id='1')
+        await db.commit()
+
+    def request(cursor: str | None = None, direction: HistoryDirection = HistoryDirection.BEFORE) -> MessageRequest:
+        return MessageRequest(size=2, mode=HistoryMode.CURSOR, cursor=cursor, direction=direction)
+
+    # Act
+    latest: MessageCursorPage = await message_service.get_messages_by_cursor(db=db, chat_id=chat.id,
+                                                                             request=request())
+    older: MessageCursorPage = await message_service.get_messages_by_cursor(db=db, chat_id=chat.id,
+                                                                            request=request(latest.before))
+    oldest: MessageCursorPage = await message_service.get_messages_by_cursor(db=db, chat_id=chat.id,
+                                                                             request=request(older.before))
+    newer: MessageCursorPage = await message_service.get_messages_by_cursor(
+        db=db, chat_id=chat.id, request=request(oldest.after, direction=HistoryDirection.AFTER)
+    )
+    newest: MessageCursorPage = await message_service.get_messages_by_cursor(
+        db=db, chat_id=chat.id, request=request(latest.after, direction=HistoryDirection.AFTER)
+    )
+
+    # Assert
+    assert [message.text for message in latest.items] == ['text3', 'text4']
+    assert [message.text for message in older.items] == ['text1', 'text2']
+    assert [message.text for message in oldest.items] == ['text0']
+    assert oldest.before is None
+    assert [message.text for message in newer.items] == ['text1', 'text2']
+    assert newer.after == older.after
+    assert newer.before == older.before
+    assert newest.items == []
+    assert newest.after == latest.after
+
+    with pytest.raises(InvalidCursorException) as exc:
+        await message_service.get_messages_by_cursor(db=db, chat_id=chat.id, request=request('not a cursor'))
+    assert exc.value.status_code == status.HTTP_400_BAD_REQUEST
+    assert exc.value.error_code == ErrorCodeType.INVALID_CURSOR
+
+
 @pytest.mark.asyncio
 async def test_read_message_private(db: AsyncSession, db_transaction: AsyncSession):
     # Arrange
@@ -187,19 +587,15 @@ async def test_read_message_private(db: AsyncSession, db_transaction: AsyncSessi
     await db.commit()
 
     # Act
-    message: Message = await message_service.read_message(db=db_transaction, message_id=message_before.id,
-                                                          current_user_id=user2.id)
+    await message_service.read_messages(db=db_transaction, message_ids=[message_before.id], current_user_id=user2.id)
     await db_transaction.commit()
 
     # Assert
-    assert message is not None
-    assert message.id == message_before.id
-    assert message.chat_id == message_before.chat_id
-    assert message.text == message_before.text
-    assert message.sender_id == message_before.sender_id
-    assert message.send_at is not None
+    message_db: MessageModel = await db.get(MessageModel, message_before.id, populate_existing=True)
+    assert message_db.text == message_before.text
+    assert message_db.sender_id == message_before.sender_id
     assert message_before.read_at is None
-    assert message.read_at is not None
+    assert message_db.read_at is not None
 
 
 @pytest.mark.asyncio
@@ -229,16 +625,106 @@ async def test_read_message_group(db: AsyncSession, db_transaction: AsyncSession
 
     # Act
     for user_id in user_ids:
-        message: Message = await message_service.read_message(db=db_transaction, message_id=message_before.id,
-                                                              current_user_id=user_id)
+        await message_service.read_messages(db=db_transaction, message_ids=[message_before.id],
+                                            current_user_id=user_id)
     await db_transaction.commit()
 
     # Assert
-    assert message is not None
-    assert message.id == message_before.id
-    assert message.chat_id == message_before.chat_id
-    assert message.text == message_before.text
-    assert message.sender_id == message_before.sender_id
-    assert message.send_at is not None
+    message_db: MessageModel = await db.get(MessageModel, message_before.id, populate_existing=True)
+    assert message_db.text == message_before.text
+    assert message_db.sender_id == message_before.sender_id
     assert message_before.read_at is None
-    assert message.read_at is not None
+    assert message_db.read_at is not None
+
+
+@pytest.mark.asyncio
+async def test_read_messages_batch(db: AsyncSession, db_transaction: AsyncSession):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='test')
+    group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user.id)
+
+    user_ids: list[int] = []
+    for i in range(2):
+        create_data: UserCreateRequest = UserCreateRequest(username=f'user{i}', password='password')
+        member_user: User = await user_service.create_user(db=db, create_data=create_data)
+        user_ids.append(member_user.id)
+
+    group_users_request: GroupUsersCreateRequest = GroupUsersCreateRequest(group_id=group.id, user_ids=user_ids)
+    await group_service.add_users_to_group(db=db, group_users_request=group_users_request, current_user_id=user.id)
+
+    private_chat: Chat = await chat_service.create_private_chat(db=db, user_id=user_ids[0], current_user_id=user.id)
+
+    message_ids: list[UUID] = []
+    for chat_id in [group.chat_id, group.chat_id, private_chat.id]:
+        create_data: MessageCreateRequest = MessageCreateRequest(id=uuid4(), chat_id=chat_id, text='text')
+        message: Message = await message_service.send_message(db=db, create_data=create_data,
+                                                              current_user_id=user.id, device_id='1')
+        message_ids.append(message.id)
+    await db.commit()
+
+    # Act
+    await message_service.read_messages(db=db_transaction, message_ids=message_ids, current_user_id=user_ids[0])
+    await db_transaction.commit()
+    db.expire_all()
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel)
+                                                        .where(MessageModel.id.in_(message_ids))
+                                                        .order_by(MessageModel.send_at))).all()
+    partially_read: dict[UUID, bool] = {message_db.id: message_db.read_at is not None for message_db in messages_db}
+
+    await message_service.read_messages(db=db, message_ids=message_ids, current_user_id=user_ids[1])
+    await db.commit()
+    db.expire_all()
+    fully_read: list[MessageModel] = (await db.scalars(select(MessageModel)
+                                                       .where(MessageModel.id.in_(message_ids))
+                                                       .order_by(MessageModel.send_at))).all()
+
+    # Assert
+    assert partially_read == {message_ids[0]: False, message_ids[1]: False, message_ids[2]: True}
+    assert all(message_db.read_at is not None for message_db in fully_read)
+
+    read_up_to: dict[tuple[int, int], datetime] = {
+        (chat_user_db.chat_id, chat_user_db.user_id): chat_user_db.read_up_to
+        for chat_user_db in (await db.scalars(select(ChatUserModel))).all()
+    }
+    assert read_up_to[(group.chat_id, user.id)] is None
+    assert read_up_to[(group.chat_id, user_ids[0])] == fully_read[1].send_at
+    assert read_up_to[(private_chat.id, user_ids[0])] == fully_read[2].send_at
+
+
+@pytest.mark.asyncio
+async def test_read_messages_backlog_is_one_watermark_update(db: AsyncSession, capture_statements):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='user', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+
+    create_data: GroupCreateRequest = GroupCreateRequest(name='test')
+    group: Group = await group_service.create_group(db=db, create_data=create_data, current_user_id=user.id)
+
+    create_data: UserCreateRequest = UserCreateRequest(username='reader', password='password')
+    reader: User = await user_service.create_user(db=db, create_data=create_data)
+    group_users_request: GroupUsersCreateRequest = GroupUsersCreateRequest(group_id=group.id, user_ids=[reader.id])
+    await group_service.add_users_to_group(db=db, group_users_request=group_users_request, current_user_id=user.id)
+
+    messages_create: list[MessageCreate] = [MessageCreate(id=uuid4(), chat_id=group.chat_id, text='text',
+                                                          sender_id=user.id)
+                                            for _ in range(500)]
+    await message_crud.create_batch(db=db, objs_in=messages_create)
+    await db.commit()
+
+    # Act
+    with capture_statements() as statements:
+        await message_service.read_messages(db=db,
+                                            message_ids=[message_create.id for message_create in messages_create],
+                                            current_user_id=reader.id)
+        await db.commit()
+
+    # Assert
+    assert len([statement for statement in statements if statement.startswith('UPDATE chat_users')]) == 1
+    assert len(statements) == 4
+
+    messages_db: list[MessageModel] = (await db.scalars(select(MessageModel))).all()
+    assert len(messages_db) == 500
+    assert all(message_db.read_at is not None for message_db in messages_db)
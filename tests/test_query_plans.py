@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from app.crud.chat import chat_crud, chat_user_crud
+from app.crud.message import message_crud
+from app.crud.user import user_crud
+from app.schemas.chat import ChatRequest
+from app.schemas.message import HistoryMode, MessageCreate, MessageRequest, MessageSearchRequest
+from app.schemas.user import UserRequest
+
+USERS: int = 2000
+CHATS: int = 1000
+CHAT_SIZE: int = 10
+MESSAGES: int = 50000
+# Tables big enough in production that a sequential scan on them is a missing index
+INDEXED_TABLES: list[str] = ['messages', 'chat_users']
+# Not filtered by the current user, so every membership is read anyway
+FULL_SCAN_QUERIES: list[str] = ['get_chats']
+
+
+@pytest_asyncio.fixture
+async def seeded_db(engine, db):
+    await db.execute(text("INSERT INTO users (id, username) SELECT i, 'user_' || i FROM generate_series(1, :users) i"),
+                     {'users': USERS})
+    await db.execute(text("INSERT INTO chats (id, name, type) SELECT i, 'chat_' || i, 'GROUP' "
+                          "FROM generate_series(1, :chats) i"),
+                     {'chats': CHATS})
+    await db.execute(text('INSERT INTO chat_users (chat_id, user_id) '
+                          'SELECT chat_id, (chat_id * :chat_size + member) % :users + 1 '
+                          'FROM generate_series(1, :chats) chat_id, generate_series(0, :chat_size - 1) member'),
+                     {'chats': CHATS, 'chat_size': CHAT_SIZE, 'users': USERS})
+    await db.execute(text("INSERT INTO messages (id, chat_id, sender_id, text, send_at) "
+                          "SELECT gen_random_uuid(), i % :chats + 1, (i % :chats + 1) * :chat_size % :users + 1, "
+                          "       'message ' || i || ' word' || i % 1000, now() - i * interval '1 second' "
+                          "FROM generate_series(1, :messages) i"),
+                     {'chats': CHATS, 'chat_size': CHAT_SIZE, 'users': USERS, 'messages': MESSAGES})
+    await db.commit()
+    # Flushes the GIN pending list too, like autovacuum would on a live database
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE'))
+    yield db
+
+
+async def explain(db, query: Callable[..., Awaitable], capture_statements) -> list[str]:
+    """Runs the CRUD query and returns the plans of every statement it executed."""
+    with capture_statements(with_parameters=True) as statements:
+        await query(db)
+    await db.rollback()
+
+    plans: list[str] = []
+    for statement, parameters in statements:
+        result = await (await db.connection()).exec_driver_sql(f'EXPLAIN {statement}', parameters)
+        plans.append('\n'.join(row[0] for row in result))
+    return plans
+
+
+CRUD_QUERIES: dict[str, Callable[..., Awaitable]] = {
+    'create_in_chat': lambda db: message_crud.create_in_chat(db=db, obj_in=MessageCreate(id=uuid4(), chat_id=42,
+                                                                                         sender_id=421, text='text')),
+    'create_batch_in_chats': lambda db: message_crud.create_batch_in_chats(
+        db=db,
+        objs_in=[MessageCreate(id=uuid4(), chat_id=chat_id, sender_id=chat_id * CHAT_SIZE % USERS + 1, text='text')
+                 for chat_id in range(40, 50)]
+    ),
+    'get_messages': lambda db: message_crud.get_messages(db=db, chat_id=42, request=MessageRequest()),
+    'get_messages_by_sender': lambda db: message_crud.get_messages(db=db, chat_id=42,
+                                                                   request=MessageRequest(sender_id=421)),
+    'get_messages_by_search_term': lambda db: message_crud.get_messages(db=db, chat_id=42,
+                                                                        request=MessageRequest(search_term='word42')),
+    'get_messages_by_cursor': lambda db: message_crud.get_messages_by_cursor(
+        db=db, chat_id=42, request=MessageRequest(mode=HistoryMode.CURSOR), cursor=None, limit=20
+    ),
+    'get_last_send_at': lambda db: message_crud.get_last_send_at(db=db, chat_id=42),
+    'search_messages': lambda db: message_crud.search_messages(db=db, request=MessageSearchRequest(query='word42'),
+                                                               user_id=421),
+    'mark_read_by_watermarks': lambda db: message_crud.mark_read_by_watermarks(
+        db=db, chat_id=42, read_up_to=datetime.now(), read_after=datetime.now() - timedelta(minutes=1)
+    ),
+    'get_chat_user_ids': lambda db: chat_user_crud.get_chat_user_ids(db=db, chat_id=42),
+    'get_user_chat_ids': lambda db: chat_user_crud.get_user_chat_ids(db=db, user_id=421, chat_ids=[42, 43]),
+    'get_unread_chats': lambda db: chat_user_crud.get_unread_chats(db=db, user_id=421),
+    'mark_read_up_to': lambda db: chat_user_crud.mark_read_up_to(db=db, chat_id=42, user_id=421,
+                                                                 read_up_to=datetime.now()),
+    'get_users_by_chat': lambda db: user_crud.get_users(db=db, request=UserRequest(chat_id=42), current_user_id=421),
+    'get_chats': lambda db: chat_crud.get_chats(db=db, request=ChatRequest(search_term='chat_42'),
+                                                current_user_id=421),
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('query_name', CRUD_QUERIES)
+async def test_query_plans_use_indexes(seeded_db, capture_statements, query_name):
+    # Arrange
+    query: Callable[..., Awaitable] = CRUD_QUERIES[query_name]
+
+    # Act
+    plans: list[str] = await explain(db=seeded_db, query=query, capture_statements=capture_statements)
+
+    # Assert
+    assert len(plans) > 0
+    if query_name in FULL_SCAN_QUERIES:
+        return
+    for plan in plans:
+        for table in INDEXED_TABLES:
+            assert f'Seq Scan on {table}' not in plan, plan
@@ -0,0 +1,27 @@
+import pytest
+
+from app.schemas.stats import Stats
+from app.services import stats_service
+from app.services.connection_registry import Connection
+from app.services.password_hasher import password_hasher
+from app.services.rate_limiter import login_rate_limiter
+from app.services.websocket_manager import websocket_manager
+
+
+@pytest.mark.asyncio
+async def test_get_stats(websocket_factory):
+    # Arrange
+    stats_before: Stats = stats_service.get_stats()
+    connection: Connection = await websocket_manager.connect(websocket=websocket_factory(), user_id=1, device_id='1')
+    await password_hasher.hash(password='password')
+    await login_rate_limiter.check(username='user', address='10.0.0.1')
+
+    # Act
+    stats: Stats = stats_service.get_stats()
+
+    # Assert
+    assert stats.websocket.connections == stats_before.websocket.connections + 1
+    assert stats.password_hasher.completed == stats_before.password_hasher.completed + 1
+    assert stats.login_rate_limiter.allowed == stats_before.login_rate_limiter.allowed + 1
+
+    websocket_manager.disconnect(connection=connection)
@@ -1,16 +1,24 @@
+from contextlib import asynccontextmanager
+
 import pytest
 from fastapi_pagination import Page
-from sqlalchemy import select
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
+from app.api.deps import get_db_read_only, get_user_id
 from app.configs.logging_settings import LogLevelType
+from app.configs.settings import (database_settings, login_rate_limit_settings, message_bus_settings, MessageBusType,
+                                  RateLimiterBackendType)
+from app.db.postgres import get_max_overflows
 from app.exceptions.conflict_409 import IntegrityException
 from app.exceptions.not_fount_404 import EntityNotFound
 from app.models.user import User as UserModel
 from app.schemas.error_response import ErrorCodeType
+from app.schemas.jwt import TokenDataCreate, Tokens
 from app.schemas.user import User, UserCreateRequest, UserRequest
-from app.services import user_service
+from app.services import jwt_service, user_service
 
 
 @pytest.mark.asyncio
@@ -67,6 +75,76 @@ async def test_get_user_ok(db: AsyncSession):
     assert user.username == user_before.username
 
 
+@pytest.mark.asyncio
+async def test_get_user_read_only_session(db: AsyncSession, engine, read_only_engine):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='test', password='password')
+    user_before: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+
+    transaction_queries: list[str] = []
+    read_only_transaction_queries: list[str] = []
+
+    def log_queries(queries: list[str]):
+        # asyncpg logs the transaction control statements, which never reach the cursor events
+        def add_query_logger(dbapi_connection, connection_record, connection_proxy):
+            dbapi_connection.driver_connection.add_query_logger(lambda record: queries.append(record.query))
+        return add_query_logger
+
+    event.listen(engine.sync_engine, 'checkout', log_queries(queries=transaction_queries))
+    event.listen(read_only_engine.sync_engine, 'checkout', log_queries(queries=read_only_transaction_queries))
+
+    # Act
+    await user_service.get_user(db=db, user_id=user_before.id)
+    await db.commit()
+
+    async with asynccontextmanager(get_db_read_only)() as read_only_db:
+        user: User = await user_service.get_user(db=read_only_db, user_id=user_before.id)
+        with pytest.raises(DBAPIError) as exc:
+            await read_only_db.execute(text("UPDATE users SET username = 'changed'"))
+
+    # Assert
+    assert user.id == user_before.id
+    assert transaction_queries == ['BEGIN;', 'COMMIT;']
+    assert read_only_transaction_queries == []
+    assert 'read-only transaction' in str(exc.value)
+    assert read_only_engine.pool.size() == database_settings.read_only_pool_size
+
+
+def test_max_overflows_count_other_pools(monkeypatch):
+    # Arrange
+    monkeypatch.setattr(database_settings, 'max_connections', 32)
+    monkeypatch.setattr(message_bus_settings, 'type', MessageBusType.POSTGRES)
+    monkeypatch.setattr(message_bus_settings, 'pool_size', 4)
+    monkeypatch.setattr(login_rate_limit_settings, 'backend', RateLimiterBackendType.POSTGRES)
+    monkeypatch.setattr(login_rate_limit_settings, 'pool_size', 4)
+
+    # Act
+    max_overflow, read_only_max_overflow = get_max_overflows()
+
+    # Assert
+    assert (max_overflow, read_only_max_overflow) == (11, 10)
+    engine_connections: int = database_settings.pool_size + max_overflow
+    read_only_engine_connections: int = database_settings.read_only_pool_size + read_only_max_overflow
+    assert engine_connections + read_only_engine_connections + 4 + 1 + 4 == 32
+
+
+@pytest.mark.asyncio
+async def test_get_user_id_releases_connection(db: AsyncSession, read_only_engine):
+    # Arrange
+    create_data: UserCreateRequest = UserCreateRequest(username='test', password='password')
+    user: User = await user_service.create_user(db=db, create_data=create_data)
+    await db.commit()
+    tokens: Tokens = jwt_service.generate_auth_tokens(token_data=TokenDataCreate(sub=str(user.id)))
+
+    # Act
+    user_id: int = await get_user_id(token=tokens.access_token)
+
+    # Assert
+    assert user_id == user.id
+    assert read_only_engine.pool.checkedout() == 0
+
+
 @pytest.mark.asyncio
 async def test_get_user_not_found(db: AsyncSession):
     # Arrange
@@ -0,0 +1,341 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import asyncpg
+import pytest
+from starlette import status
+
+from app.configs.settings import OverflowPolicyType
+from app.schemas.chat import Chat, ChatType
+from app.schemas.message import Message
+from app.services.connection_registry import Connection, ConnectionRegistry
+from app.services.message_bus import InMemoryMessageBus, PostgresMessageBus
+from app.services.websocket_manager import WebsocketManager
+
+
+class SlowWebsocket:
+    def __init__(self):
+        self.released: asyncio.Event = asyncio.Event()
+        self.closed_code: int | None = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_code = code
+
+    async def send_text(self, _: str) -> None:
+        await self.released.wait()
+
+
+def _message(chat_id: int = 1, sender_id: int = 1, text: str = 'text') -> Message:
+    return Message(id=uuid4(), chat_id=chat_id, sender_id=sender_id, text=text, send_at=datetime.now(),
+                   chat=Chat(id=chat_id, name='test chat', type=ChatType.GROUP))
+
+
+@pytest.mark.asyncio
+async def test_send_message_in_memory_bus(websocket_factory):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus())
+    sender_websocket = websocket_factory()
+    recipient_websocket = websocket_factory()
+    stranger_websocket = websocket_factory()
+    await manager.connect(websocket=sender_websocket, chat_id=1, user_id=1, device_id='1')
+    await manager.connect(websocket=recipient_websocket, chat_id=1, user_id=2, device_id='2')
+    await manager.connect(websocket=stranger_websocket, chat_id=2, user_id=3, device_id='3')
+
+    message: Message = _message()
+
+    # Act
+    await manager.send_message(message=message, chat_id=1, chat_user_ids={1, 2}, device_id='1')
+    await manager.flush()
+
+    # Assert
+    assert recipient_websocket.sent == [message.model_dump(mode='json')]
+    assert sender_websocket.sent == []
+    assert stranger_websocket.sent == []
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_message_postgres_bus_across_workers(websocket_factory, database_dsn: str, wait_for):
+    # Arrange
+    sender_manager: WebsocketManager = WebsocketManager(message_bus=PostgresMessageBus(dsn=database_dsn))
+    recipient_manager: WebsocketManager = WebsocketManager(message_bus=PostgresMessageBus(dsn=database_dsn))
+    await sender_manager.message_bus.start()
+    await recipient_manager.message_bus.start()
+
+    recipient_websocket = websocket_factory()
+    await recipient_manager.connect(websocket=recipient_websocket, chat_id=1, user_id=2, device_id='2')
+
+    message: Message = _message(text='long text ' * 400)
+
+    # Act
+    await sender_manager.send_message(message=message, chat_id=1, chat_user_ids={1, 2}, device_id='1')
+    await wait_for(lambda: len(recipient_websocket.sent) > 0)
+
+    # Assert
+    assert recipient_websocket.sent == [message.model_dump(mode='json')]
+
+    await recipient_manager.stop()
+    await sender_manager.message_bus.stop()
+    await recipient_manager.message_bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_postgres_bus_splits_big_payload(database_dsn: str, wait_for):
+    # Arrange
+    message_bus: PostgresMessageBus = PostgresMessageBus(dsn=database_dsn, channel_prefix='test')
+    received: list[str] = []
+
+    async def handler(payload: str) -> None:
+        received.append(payload)
+
+    message_bus.subscribe(channel='events', handler=handler)
+    await message_bus.start()
+    payload: str = 'привет мир ' * 2000
+
+    # Act
+    await message_bus.publish(channel='events', payload=payload)
+    await wait_for(lambda: len(received) > 0)
+
+    # Assert
+    assert received == [payload]
+
+    await message_bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_postgres_bus_reconnects_lost_listen_connection(database_dsn: str, wait_for):
+    # Arrange
+    message_bus: PostgresMessageBus = PostgresMessageBus(dsn=database_dsn, channel_prefix='test')
+    message_bus.min_reconnect_delay = 0.01
+    received: list[str] = []
+
+    async def handler(payload: str) -> None:
+        received.append(payload)
+
+    message_bus.subscribe(channel='events', handler=handler)
+    await message_bus.start()
+    lost_connection: asyncpg.Connection = message_bus.listen_connection
+
+    # Act
+    connection: asyncpg.Connection = await asyncpg.connect(dsn=database_dsn)
+    await connection.execute('SELECT pg_terminate_backend($1)', lost_connection.get_server_pid())
+    await connection.close()
+    await wait_for(lambda: message_bus.listen_connection not in (None, lost_connection))
+    await message_bus.publish(channel='events', payload='after reconnect')
+    await wait_for(lambda: len(received) > 0)
+
+    # Assert
+    assert received == ['after reconnect']
+
+    await message_bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_message_slow_consumer_does_not_block(websocket_factory, wait_for):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(), queue_size=10)
+    slow_websocket: SlowWebsocket = SlowWebsocket()
+    fast_websocket = websocket_factory()
+    await manager.connect(websocket=slow_websocket, chat_id=1, user_id=2, device_id='2')
+    await manager.connect(websocket=fast_websocket, chat_id=1, user_id=3, device_id='3')
+
+    # Act
+    async with asyncio.timeout(1):
+        for _ in range(5):
+            await manager.send_message(message=_message(), chat_id=1, chat_user_ids={1, 2, 3}, device_id='1')
+    await wait_for(lambda: len(fast_websocket.sent) == 5)
+
+    # Assert
+    assert manager.get_stats().queued_messages == 4
+    assert manager.get_stats().max_queue_depth == 4
+
+    slow_websocket.released.set()
+    await manager.flush()
+    assert manager.get_stats().queued_messages == 0
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_message_overflow_drop_oldest():
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(),
+                                                 queue_size=2,
+                                                 overflow_policy=OverflowPolicyType.DROP_OLDEST)
+    slow_websocket: SlowWebsocket = SlowWebsocket()
+    await manager.connect(websocket=slow_websocket, chat_id=1, user_id=2, device_id='2')
+
+    # Act
+    for _ in range(4):
+        await manager.send_message(message=_message(), chat_id=1, chat_user_ids={1, 2}, device_id='1')
+
+    # Assert
+    assert manager.get_stats().dropped_messages == 2
+    assert manager.get_stats().connections == 1
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_message_overflow_disconnect(wait_for):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(),
+                                                 queue_size=1,
+                                                 overflow_policy=OverflowPolicyType.DISCONNECT)
+    slow_websocket: SlowWebsocket = SlowWebsocket()
+    await manager.connect(websocket=slow_websocket, chat_id=1, user_id=2, device_id='2')
+
+    # Act
+    for _ in range(2):
+        await manager.send_message(message=_message(), chat_id=1, chat_user_ids={1, 2}, device_id='1')
+    await wait_for(lambda: slow_websocket.closed_code is not None)
+
+    # Assert
+    assert slow_websocket.closed_code == status.WS_1008_POLICY_VIOLATION
+    assert manager.get_stats().evicted_connections == 1
+    assert manager.get_stats().connections == 0
+    assert manager.registry.chat_index == {}
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_message_to_all_user_devices(websocket_factory):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus())
+    phone_websocket = websocket_factory()
+    laptop_websocket = websocket_factory()
+    phone_connection = await manager.connect(websocket=phone_websocket, user_id=2, device_id='phone')
+    laptop_connection = await manager.connect(websocket=laptop_websocket, user_id=2, device_id='laptop')
+    manager.subscribe(connection=phone_connection, chat_ids={1, 2})
+    manager.subscribe(connection=laptop_connection, chat_ids={1})
+
+    first_message: Message = _message(chat_id=1)
+    second_message: Message = _message(chat_id=2)
+
+    # Act
+    await manager.send_message(message=first_message, chat_id=1, chat_user_ids={1, 2}, device_id='1')
+    await manager.send_message(message=second_message, chat_id=2, chat_user_ids={1, 2}, device_id='1')
+    await manager.flush()
+
+    # Assert
+    assert phone_websocket.sent == [first_message.model_dump(mode='json'), second_message.model_dump(mode='json')]
+    assert laptop_websocket.sent == [first_message.model_dump(mode='json')]
+    assert len(manager.get_user_connections(user_id=2)) == 2
+
+    manager.disconnect(connection=phone_connection)
+    assert manager.get_user_connections(user_id=2) == [laptop_connection]
+    assert manager.registry.chat_index == {1: {laptop_connection.key}}
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_connect_rejects_when_full(websocket_factory):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(), max_connections=2)
+    first_websocket = websocket_factory()
+    second_websocket = websocket_factory()
+    rejected_websocket = websocket_factory()
+    first_connection = await manager.connect(websocket=first_websocket, chat_id=1, user_id=1, device_id='1')
+    await manager.connect(websocket=second_websocket, chat_id=1, user_id=2, device_id='2')
+
+    # Act
+    rejected_connection = await manager.connect(websocket=rejected_websocket, chat_id=1, user_id=3, device_id='3')
+    reconnected = await manager.connect(websocket=websocket_factory(), chat_id=1, user_id=1, device_id='1')
+
+    # Assert
+    assert rejected_connection is None
+    assert rejected_websocket.closed_code == status.WS_1013_TRY_AGAIN_LATER
+    assert first_websocket.closed_code is None
+    assert second_websocket.closed_code is None
+    assert reconnected is not None
+    assert manager.registry.get(first_connection.key) is reconnected
+    assert manager.registry.chat_index == {1: {(1, '1', 1), (2, '2', 1)}}
+    assert manager.get_stats().connections == 2
+    assert manager.get_stats().rejected_connections == 1
+
+    await manager.stop()
+
+
+def test_connection_registry_indexes():
+    # Arrange
+    registry: ConnectionRegistry = ConnectionRegistry(max_connections=10)
+    chat_connection: Connection = Connection(websocket=None, user_id=1, device_id='phone', chat_id=1, queue_size=1)
+    device_connection: Connection = Connection(websocket=None, user_id=1, device_id='phone', chat_id=None,
+                                               queue_size=1)
+    other_connection: Connection = Connection(websocket=None, user_id=2, device_id='laptop', chat_id=1, queue_size=1)
+
+    # Act
+    for connection in (chat_connection, device_connection, other_connection):
+        registry.add(connection)
+    registry.subscribe(connection=device_connection, chat_ids={1, 2})
+
+    # Assert
+    assert set(registry.get_chat_connections(chat_id=1)) == {chat_connection, device_connection, other_connection}
+    assert registry.get_chat_connections(chat_id=2) == [device_connection]
+    assert set(registry.get_device_connections(user_id=1, device_id='phone')) == {chat_connection, device_connection}
+    assert registry.get_user_connections(user_id=2) == [other_connection]
+
+    registry.remove(device_connection)
+    assert registry.chat_index == {1: {chat_connection.key, other_connection.key}}
+    assert registry.get_device_connections(user_id=1, device_id='phone') == [chat_connection]
+    assert len(registry) == 2
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_pings_and_reaps_silent_connections(websocket_factory):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(),
+                                                 heartbeat_interval=0.05,
+                                                 heartbeat_timeout=0.2)
+    alive_websocket = websocket_factory()
+    silent_websocket = websocket_factory()
+    alive_connection = await manager.connect(websocket=alive_websocket, user_id=1, device_id='1')
+    silent_connection = await manager.connect(websocket=silent_websocket, user_id=2, device_id='2')
+    manager.subscribe(connection=alive_connection, chat_ids={1})
+    manager.subscribe(connection=silent_connection, chat_ids={1})
+
+    # Act
+    await manager.start()
+    async with asyncio.timeout(5):
+        while silent_websocket.closed_code is None:
+            manager.touch(connection=alive_connection)
+            await asyncio.sleep(0.01)
+
+    # Assert
+    assert silent_websocket.closed_code == status.WS_1001_GOING_AWAY
+    assert {'type': 'ping'} in alive_websocket.sent
+    assert alive_websocket.closed_code is None
+    assert manager.get_user_connections(user_id=2) == []
+    assert manager.registry.chat_index == {1: {alive_connection.key}}
+    assert manager.get_stats().reaped_connections == 1
+
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_skips_chat_connections(websocket_factory):
+    # Arrange
+    manager: WebsocketManager = WebsocketManager(message_bus=InMemoryMessageBus(),
+                                                 heartbeat_interval=0.05,
+                                                 heartbeat_timeout=0.2)
+    chat_websocket = websocket_factory()
+    chat_connection = await manager.connect(websocket=chat_websocket, chat_id=1, user_id=1, device_id='1')
+
+    # Act
+    await manager.start()
+    await asyncio.sleep(0.5)
+
+    # Assert
+    assert chat_websocket.sent == []
+    assert chat_websocket.closed_code is None
+    assert manager.registry.get(chat_connection.key) is chat_connection
+    assert manager.get_stats().reaped_connections == 0
+
+    await manager.stop()